@@ -24,7 +24,7 @@ import websocket
 try:
     from delta_sync import (
         MetadataCache, DeltaSyncCalculator, FileMetadata, 
-        create_delta_payload, DEFAULT_BLOCK_SIZE
+        create_delta_payload, DEFAULT_BLOCK_SIZE, DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS
     )
     DELTA_SYNC_AVAILABLE = True
 except ImportError:
@@ -137,6 +137,15 @@ class SimplifiedMCPClient:
                     logger.warning("服务器不支持增量同步，将使用完整传输")
                     self.use_delta_sync = False
                 
+                # 本地元数据的哈希算法需与服务器一致，否则哈希永远不匹配
+                if self.use_delta_sync:
+                    hash_algorithm = data.get("hash_algorithm", DEFAULT_HASH_ALGORITHM)
+                    if hash_algorithm in HASH_ALGORITHMS:
+                        self.delta_calculator.algorithm = hash_algorithm
+                    else:
+                        logger.warning(f"不支持服务器使用的哈希算法 {hash_algorithm}，将使用完整传输")
+                        self.use_delta_sync = False
+                
                 return True
             else:
                 logger.error(f"连接服务器失败: {response.status_code}")
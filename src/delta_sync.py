@@ -27,13 +27,15 @@ logger = logging.getLogger(__name__)
 DEFAULT_BLOCK_SIZE = 4096  # 4KB分块大小
 DEFAULT_CACHE_FILE = ".mcp_cache.json"
 DEFAULT_HASH_ALGORITHM = "md5"  # 可选: sha1, sha256等
+HASH_ALGORITHMS = ("md5", "sha1", "sha256")  # 需与服务器的--hash-algorithm一致
 
 
 class FileMetadata:
     """文件元数据类，存储文件的基本信息和块哈希值"""
     
     def __init__(self, path: str, mtime: float = 0, size: int = 0, 
-                full_hash: str = "", blocks: Dict[int, str] = None):
+                full_hash: str = "", blocks: Dict[int, str] = None,
+                algorithm: str = DEFAULT_HASH_ALGORITHM):
         """
         初始化文件元数据
         
@@ -43,12 +45,14 @@ class FileMetadata:
             size: 文件大小(字节)
             full_hash: 文件完整哈希值
             blocks: 文件分块的哈希值字典 {块索引: 哈希值}
+            algorithm: 计算哈希值使用的算法
         """
         self.path = path
         self.mtime = mtime
         self.size = size
         self.full_hash = full_hash
         self.blocks = blocks or {}
+        self.algorithm = algorithm
     
     @classmethod
     def from_file(cls, file_path: str, block_size: int = DEFAULT_BLOCK_SIZE,
@@ -95,7 +99,7 @@ class FileMetadata:
         
         full_hash = full_hasher.hexdigest()
         
-        return cls(str(path_obj), mtime, size, full_hash, blocks)
+        return cls(str(path_obj), mtime, size, full_hash, blocks, algorithm)
     
     def to_dict(self) -> Dict:
         """转换为字典表示"""
@@ -104,7 +108,8 @@ class FileMetadata:
             "mtime": self.mtime,
             "size": self.size,
             "full_hash": self.full_hash,
-            "blocks": self.blocks
+            "blocks": self.blocks,
+            "algorithm": self.algorithm
         }
     
     @classmethod
@@ -115,7 +120,8 @@ class FileMetadata:
             mtime=data.get("mtime", 0),
             size=data.get("size", 0),
             full_hash=data.get("full_hash", ""),
-            blocks=data.get("blocks", {})
+            blocks=data.get("blocks", {}),
+            algorithm=data.get("algorithm", DEFAULT_HASH_ALGORITHM)
         )
 
 
@@ -182,19 +188,21 @@ class MetadataCache:
             logger.error(f"保存缓存失败: {str(e)}")
             return False
     
-    def update_local_metadata(self, file_path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> FileMetadata:
+    def update_local_metadata(self, file_path: str, block_size: int = DEFAULT_BLOCK_SIZE,
+                              algorithm: str = DEFAULT_HASH_ALGORITHM) -> FileMetadata:
         """
         更新本地文件元数据
         
         Args:
             file_path: 文件路径
             block_size: 块大小
+            algorithm: 哈希算法
             
         Returns:
             文件元数据
         """
         try:
-            metadata = FileMetadata.from_file(file_path, block_size)
+            metadata = FileMetadata.from_file(file_path, block_size, algorithm)
             self.local_cache[metadata.path] = metadata
             return metadata
         except Exception as e:
@@ -264,16 +272,19 @@ class MetadataCache:
 class DeltaSyncCalculator:
     """增量同步计算器，计算文件变更和需要传输的块"""
     
-    def __init__(self, cache: MetadataCache, block_size: int = DEFAULT_BLOCK_SIZE):
+    def __init__(self, cache: MetadataCache, block_size: int = DEFAULT_BLOCK_SIZE,
+                 algorithm: str = DEFAULT_HASH_ALGORITHM):
         """
         初始化增量同步计算器
         
         Args:
             cache: 元数据缓存对象
             block_size: 块大小(字节)
+            algorithm: 哈希算法，需与服务器元数据使用的算法一致
         """
         self.cache = cache
         self.block_size = block_size
+        self.algorithm = algorithm
     
     def calculate_delta(self, local_path: str, remote_path: str) -> Dict:
         """
@@ -290,8 +301,9 @@ class DeltaSyncCalculator:
         try:
             local_meta = self.cache.get_local_metadata(local_path)
             if not local_meta or not os.path.exists(local_path) or \
-               os.path.getmtime(local_path) > local_meta.mtime:
-                local_meta = self.cache.update_local_metadata(local_path, self.block_size)
+               os.path.getmtime(local_path) > local_meta.mtime or \
+               local_meta.algorithm != self.algorithm:
+                local_meta = self.cache.update_local_metadata(local_path, self.block_size, self.algorithm)
         except Exception as e:
             logger.error(f"获取本地文件元数据失败: {str(e)}")
             return {
@@ -10,17 +10,26 @@ Sync-HTTP-MCP Remote Server
 
 import asyncio
 import base64
+import bisect
+import codecs
 import hashlib
 import json
 import logging
+import math
 import os
+import re
 import subprocess
 import sys
+import threading
 import time
 import uuid
 import shutil
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Union, Any, Tuple
+from stat import S_ISDIR
+from typing import Dict, List, Optional, Union, Any, Tuple, Iterable, AsyncIterator
 
 # 尝试导入GitPython库，如果不可用则设置标志
 try:
@@ -37,11 +46,35 @@ try:
 except ImportError:
     GIT_STATE_AVAILABLE = False
 
-import aiofiles
+# 尝试导入pybase64（基于SIMD的Base64实现），不可用时使用标准库
+try:
+    import pybase64
+    b64decode = pybase64.b64decode
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    b64decode = base64.b64decode
+    PYBASE64_AVAILABLE = False
+
+# 尝试导入blake3（基于SIMD的哈希实现），可用时客户端可以选择它作为上传校验和算法
+try:
+    from blake3 import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+# 尝试导入msgpack，可用时批量同步可以直接携带原始字节，无需Base64编码
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+import orjson
 import uvicorn
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pydantic import BaseModel, Field
 
 # 配置日志
@@ -56,6 +89,7 @@ app = FastAPI(
     title="Sync-HTTP-MCP Remote Server",
     description="百度内网远程开发服务器",
     version="0.2.0",
+    default_response_class=ORJSONResponse,
 )
 
 # 添加CORS中间件
@@ -67,22 +101,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 添加响应压缩中间件：Base64文件内容和块哈希字典压缩率很高，小响应不压缩
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # 程序配置
 SERVER_CONFIG = {
     "test_mode": False,  # 是否为本地测试模式
     "test_root_dir": str(Path.home() / "mcp_test_root"),  # 测试模式下的虚拟根目录，默认为用户主目录下的mcp_test_root
     "cache_dir": "~/.mcp_cache",  # Git状态缓存目录
     "git_cache_enabled": True,  # 是否启用Git状态缓存
+    "hash_algorithm": "md5",  # 文件元数据使用的哈希算法，需与客户端delta_sync一致
 }
 
+# 可选的元数据哈希算法（与客户端delta_sync.get_hasher支持的算法一致）
+HASH_ALGORITHMS = ("md5", "sha1", "sha256")
+# 上传内容校验和支持的算法，默认为md5
+CHECKSUM_ALGORITHMS = ("md5", "blake3") if BLAKE3_AVAILABLE else ("md5",)
+
 # 全局状态管理
 GIT_STATE_MANAGERS = {}  # 路径 -> GitStateManager 实例
 
 # 通用路径映射函数
+@lru_cache(maxsize=2048)
 def map_remote_path(path: str) -> str:
     """
     将远程路径映射到本地路径
     
+    映射结果只取决于启动时确定的SERVER_CONFIG，因此可以按路径缓存。
+    
     Args:
         path: 原始路径
         
@@ -99,6 +145,22 @@ def map_remote_path(path: str) -> str:
     # 当前服务器可能运行在Linux环境，有/home目录
     return path
 
+
+@lru_cache(maxsize=2048)
+def cached_path(path: str) -> Path:
+    """
+    将路径字符串转换为Path对象，重复访问的路径复用同一个对象
+    
+    Path是不可变对象，缓存后可以安全共享。
+    
+    Args:
+        path: 路径字符串
+        
+    Returns:
+        Path对象
+    """
+    return Path(path)
+
 # 数据模型
 class FileInfo(BaseModel):
     """文件信息模型"""
@@ -114,6 +176,7 @@ class FileContent(BaseModel):
     path: str
     content: str  # base64 encoded
     checksum: Optional[str] = None
+    checksum_algorithm: str = "md5"  # 校验和算法，取值见CHECKSUM_ALGORITHMS
 
 
 class FileContentResponse(BaseModel):
@@ -153,7 +216,7 @@ class DeltaContent(BaseModel):
     delta_type: str  # "full", "delta", "none"
     full_hash: str
     size: int
-    blocks: Optional[Dict[str, str]] = None  # 块索引 -> base64编码内容
+    blocks: Optional[Dict[int, str]] = None  # 块索引 -> base64编码内容，JSON中的字符串键由模型解析为整数
     content: Optional[str] = None  # 完整内容(base64编码)
 
 
@@ -171,12 +234,18 @@ class DeltaSyncResponse(BaseModel):
     metadata: Dict[str, Any] = {}
 
 
+class MetadataQueryRequest(BaseModel):
+    """批量查询文件元数据的请求模型"""
+    paths: List[str]
+
+
 class CommandRequest(BaseModel):
     """命令执行请求模型"""
     command: str
     working_directory: str
     environment: Optional[Dict[str, str]] = None
     timeout: Optional[int] = 300
+    argv: Optional[List[str]] = None  # 提供时直接执行该参数列表，不经过shell
 
 
 class CommandResponse(BaseModel):
@@ -238,9 +307,16 @@ class GitConflictResolutionRequest(BaseModel):
 
 # 应用状态
 active_commands = {}  # command_id -> command_info
-file_metadata_cache = {}  # file_path -> metadata
+file_metadata_cache = OrderedDict()  # file_path -> metadata，按最近使用顺序排列
+METADATA_CACHE_MAX_ENTRIES = 100000  # 元数据缓存最多保留的文件数
+METADATA_CACHE_SAVE_INTERVAL = 60  # 元数据缓存有变更时定期保存的间隔(秒)
+metadata_cache_dirty = False  # 元数据缓存自上次保存后是否有变更
+COMMAND_RETENTION_SECONDS = 3600  # 已结束命令的保留时间(秒)
+COMMAND_CLEANUP_INTERVAL = 300  # 清理已结束命令的间隔(秒)
 git_sync_info = {}  # path -> {"repo": repo_object, "last_sync": timestamp, "last_commit": commit_hash}
-conflict_files = {}  # path -> GitConflictFile列表
+conflict_files = {}  # path -> {文件相对路径: GitConflictFile}
+commit_to_repo = {}  # commit_hash -> path，与git_sync_info中的last_commit保持同步
+git_sync_lock = threading.Lock()  # 保护git_sync_info与commit_to_repo的联合更新
 
 
 # Git相关函数
@@ -249,6 +325,72 @@ def is_git_available():
     return GIT_AVAILABLE
 
 
+def record_sync_commit(repo_key: str, commit: str, repo=None) -> None:
+    """
+    记录仓库的最新同步提交，并更新提交到仓库的索引
+    
+    Args:
+        repo_key: 仓库路径
+        commit: 提交哈希
+        repo: 可选的Repo对象，提供时替换缓存的仓库对象
+    """
+    with git_sync_lock:
+        info = git_sync_info.setdefault(repo_key, {"path": repo_key})
+        if repo is not None:
+            info["repo"] = repo
+        old_commit = info.get("last_commit")
+        if old_commit and commit_to_repo.get(old_commit) == repo_key:
+            del commit_to_repo[old_commit]
+        
+        info["last_commit"] = commit
+        info["last_sync"] = time.time()
+        commit_to_repo[commit] = repo_key
+
+
+def get_sync_repo(repo_key: str):
+    """
+    获取仓库的Repo对象
+    
+    已跟踪的同步仓库复用git_sync_info中缓存的Repo对象，避免每次请求重新解析.git目录和配置。
+    
+    Args:
+        repo_key: 仓库路径
+        
+    Returns:
+        Repo对象
+    """
+    with git_sync_lock:
+        info = git_sync_info.get(repo_key)
+        repo = info.get("repo") if info else None
+    
+    if repo is None:
+        repo = Repo(repo_key)
+        with git_sync_lock:
+            info = git_sync_info.get(repo_key)
+            if info is not None:
+                repo = info.setdefault("repo", repo)
+    
+    return repo
+
+
+def find_repo_by_commit(commit: Optional[str]) -> Optional[str]:
+    """
+    根据同步提交查找仓库路径
+    
+    Args:
+        commit: 提交哈希
+        
+    Returns:
+        仓库路径，未找到时返回第一个已跟踪的仓库，没有仓库时返回None
+    """
+    # 与record_sync_commit持同一把锁，保证两个字典的读取结果一致
+    with git_sync_lock:
+        repo_key = commit_to_repo.get(commit) if commit else None
+        if repo_key:
+            return repo_key
+        return next(iter(git_sync_info), None)
+
+
 def init_git_repo(path: str, force: bool = False) -> Dict[str, Any]:
     """
     初始化Git仓库
@@ -262,7 +404,8 @@ def init_git_repo(path: str, force: bool = False) -> Dict[str, Any]:
     """
     # 路径映射
     path = map_remote_path(path)
-    repo_path = Path(path)
+    repo_path = cached_path(path)
+    repo_key = str(repo_path)
     
     # 检查Git是否可用
     if not GIT_AVAILABLE:
@@ -279,7 +422,7 @@ def init_git_repo(path: str, force: bool = False) -> Dict[str, Any]:
         if (repo_path / ".git").exists() and not force:
             # 获取状态管理器
             if GIT_STATE_AVAILABLE:
-                state_manager = get_or_create_state_manager(str(repo_path))
+                state_manager = get_or_create_state_manager(repo_key)
                 if state_manager:
                     # 扫描目录更新状态
                     state_manager.scan_directory()
@@ -287,21 +430,22 @@ def init_git_repo(path: str, force: bool = False) -> Dict[str, Any]:
                     state_manager.save_cache()
             
             # 获取当前HEAD提交
-            repo = Repo(repo_path)
+            repo = get_sync_repo(repo_key)
             current_head = repo.head.commit.hexsha
             
             # 记录同步信息
             sync_info = {
-                "path": str(repo_path),
+                "path": repo_key,
                 "last_commit": current_head,
                 "last_sync": time.time()
             }
+            record_sync_commit(repo_key, current_head, repo)
             
             return {
                 "status": "success",
                 "message": "Git仓库已存在",
                 "is_new": False,
-                "path": str(repo_path),
+                "path": repo_key,
                 "head_commit": current_head,
                 "sync_info": sync_info
             }
@@ -357,14 +501,15 @@ ENV/
         
         # 记录同步信息
         sync_info = {
-            "path": str(repo_path),
+            "path": repo_key,
             "last_commit": current_head,
             "last_sync": time.time()
         }
+        record_sync_commit(repo_key, current_head, repo)
         
         # 创建并初始化状态管理器
         if GIT_STATE_AVAILABLE:
-            state_manager = get_or_create_state_manager(str(repo_path))
+            state_manager = get_or_create_state_manager(repo_key)
             if state_manager:
                 # 扫描目录生成初始状态
                 state_manager.scan_directory()
@@ -375,7 +520,7 @@ ENV/
             "status": "success",
             "message": "Git仓库初始化成功",
             "is_new": True,
-            "path": str(repo_path),
+            "path": repo_key,
             "head_commit": current_head,
             "sync_info": sync_info
         }
@@ -390,13 +535,13 @@ ENV/
         }
 
 
-def apply_git_patch(path: str, patch_content: str, binary_files: List[Dict[str, str]] = [], 
+def apply_git_patch(path: Optional[str], patch_content: str, binary_files: List[Dict[str, str]] = [], 
                     base_commit: Optional[str] = None) -> Dict[str, Any]:
     """
     应用Git补丁到仓库
     
     Args:
-        path: 仓库路径
+        path: 仓库路径，为空时根据base_commit查找已跟踪的仓库
         patch_content: 补丁内容（base64编码）
         binary_files: 二进制文件列表
         base_commit: 基础提交
@@ -404,9 +549,19 @@ def apply_git_patch(path: str, patch_content: str, binary_files: List[Dict[str,
     Returns:
         操作结果信息
     """
-    # 路径映射
-    path = map_remote_path(path)
-    repo_path = Path(path)
+    if not path:
+        # 已跟踪仓库的路径已经过映射
+        path = find_repo_by_commit(base_commit)
+        if not path:
+            return {
+                "status": "error",
+                "message": "未找到已初始化的同步仓库"
+            }
+    else:
+        # 路径映射
+        path = map_remote_path(path)
+    repo_path = cached_path(path)
+    repo_key = str(repo_path)
     
     # 检查Git是否可用
     if not GIT_AVAILABLE:
@@ -415,8 +570,8 @@ def apply_git_patch(path: str, patch_content: str, binary_files: List[Dict[str,
             "message": "Git功能不可用，请安装GitPython库"
         }
     
-    # 检查路径是否存在且是Git仓库
-    if not repo_path.exists() or not (repo_path / ".git").exists():
+    # 检查路径是否存在且是Git仓库（.git存在即意味着仓库目录存在）
+    if not (repo_path / ".git").exists():
         return {
             "status": "error",
             "message": f"目标路径不是有效的Git仓库: {repo_path}"
@@ -456,84 +611,78 @@ def apply_git_patch(path: str, patch_content: str, binary_files: List[Dict[str,
             with open(full_path, "wb") as f:
                 f.write(file_content)
         
-        # 创建临时补丁文件
-        with tempfile.NamedTemporaryFile(suffix='.patch', delete=False, mode='w') as patch_file:
-            patch_file.write(patch_text)
-            patch_path = patch_file.name
+        # 应用补丁
+        repo = get_sync_repo(repo_key)
         
-        try:
-            # 应用补丁
-            repo = Repo(repo_path)
-            
-            # 如果指定了base_commit，先检查
-            if base_commit:
-                try:
-                    # 检查base_commit是否存在
-                    repo.git.cat_file('-e', base_commit)
-                    
-                    # 检查是否有本地未提交变更
-                    if repo.is_dirty():
-                        # 获取当前工作目录和索引的变更状态
-                        status = repo.git.status('--porcelain')
-                        if status.strip():
-                            logger.warning(f"仓库有未提交变更，尝试自动提交: {status}")
-                            repo.git.add(all=True)
-                            repo.git.commit('-m', 'Auto-commit before applying patch')
-                except GitCommandError:
-                    # base_commit不存在，返回错误
-                    return {
-                        "status": "error",
-                        "message": f"基础提交不存在: {base_commit}"
-                    }
-            
-            # 尝试应用补丁
-            result = apply_patch(repo, patch_text)
-            
-            # 如果应用成功，提交更改，否则返回冲突信息
-            if result["status"] == "success":
-                # 添加所有变更
-                repo.git.add(all=True)
-                
-                # 提交变更
-                commit = repo.index.commit("Apply sync patch")
-                
-                # 获取受影响的文件
-                affected_files = extract_files_from_patch(patch_text)
-                
-                # 更新GitStateManager
-                if GIT_STATE_AVAILABLE:
-                    state_manager = get_or_create_state_manager(str(repo_path))
-                    if state_manager:
-                        # 重新扫描整个仓库以更新状态
-                        state_manager.scan_directory()
-                        
-                        # 额外更新补丁中明确提到的文件状态
-                        for file_path in affected_files:
-                            try:
-                                full_path = os.path.join(str(repo_path), file_path)
-                                state_manager.update_file_state(full_path)
-                            except Exception as e:
-                                logger.error(f"更新文件状态失败: {file_path} - {str(e)}")
-                        
-                        # 更新同步时间戳并保存缓存
-                        state_manager.update_sync_timestamp()
-                        state_manager.save_cache()
+        # 如果指定了base_commit，先检查
+        if base_commit:
+            try:
+                # 检查base_commit是否存在
+                repo.git.cat_file('-e', base_commit)
                 
-                # 返回结果
+                # 检查是否有本地未提交变更
+                if repo.is_dirty():
+                    # 获取当前工作目录和索引的变更状态
+                    status = repo.git.status('--porcelain')
+                    if status.strip():
+                        logger.warning(f"仓库有未提交变更，尝试自动提交: {status}")
+                        repo.git.add(all=True)
+                        repo.git.commit('-m', 'Auto-commit before applying patch')
+            except GitCommandError:
+                # base_commit不存在，返回错误
                 return {
-                    "status": "success",
-                    "message": "补丁应用成功",
-                    "commit": str(commit),
-                    "affected_files": affected_files
+                    "status": "error",
+                    "message": f"基础提交不存在: {base_commit}"
                 }
-            else:
-                # 补丁应用失败，返回冲突信息
-                return result
         
-        finally:
-            # 删除临时补丁文件
-            if os.path.exists(patch_path):
-                os.unlink(patch_path)
+        # 尝试应用补丁
+        result = apply_patch(repo, patch_text)
+        
+        # 如果应用成功，提交更改，否则返回冲突信息
+        if result["status"] == "success":
+            # 添加所有变更
+            repo.git.add(all=True)
+            
+            # 提交变更
+            commit = repo.index.commit("Apply sync patch")
+            record_sync_commit(repo_key, str(commit))
+            
+            # 获取受影响的文件
+            affected_files = extract_files_from_patch(patch_text)
+            
+            # 更新GitStateManager
+            if GIT_STATE_AVAILABLE:
+                state_manager = get_or_create_state_manager(repo_key)
+                if state_manager:
+                    # 重新扫描整个仓库以更新状态
+                    state_manager.scan_directory()
+                    
+                    # 额外更新补丁中明确提到的文件状态
+                    for file_path in affected_files:
+                        try:
+                            full_path = os.path.join(repo_key, file_path)
+                            state_manager.update_file_state(full_path)
+                        except Exception as e:
+                            logger.error(f"更新文件状态失败: {file_path} - {str(e)}")
+                    
+                    # 更新同步时间戳并保存缓存
+                    state_manager.update_sync_timestamp()
+                    state_manager.save_cache()
+            
+            # 返回结果
+            return {
+                "status": "success",
+                "message": "补丁应用成功",
+                "commit": str(commit),
+                "affected_files": affected_files
+            }
+        else:
+            # 记录冲突，供冲突查询和解决使用
+            if result["status"] == "conflict":
+                conflict_files[repo_key] = {cf.path: cf for cf in result["conflicts"]}
+            
+            # 补丁应用失败，返回冲突信息
+            return result
     
     except Exception as e:
         logger.error(f"应用Git补丁失败: {str(e)}")
@@ -547,7 +696,9 @@ def apply_git_patch(path: str, patch_content: str, binary_files: List[Dict[str,
 
 def apply_patch(repo, patch_content: str) -> Dict[str, Any]:
     """
-    应用Git补丁文件
+    应用Git补丁
+    
+    补丁通过标准输入传给git apply，不再写入临时文件。
     
     Args:
         repo: Repo对象
@@ -556,60 +707,58 @@ def apply_patch(repo, patch_content: str) -> Dict[str, Any]:
     Returns:
         操作结果字典
     """
-    # 创建临时补丁文件
-    import tempfile
-    
-    patch_file = None
-    try:
-        with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.patch') as f:
-            patch_file = f.name
-            f.write(patch_content)
-        
-        try:
-            # 尝试应用补丁
-            repo.git.apply(patch_file, check=True)
-            
-            # 将改动添加到索引
-            repo.git.add(".")
-            
-            return {"success": True}
-            
-        except GitCommandError as e:
-            # 检查是否因为冲突而失败
-            if "patch does not apply" in str(e):
-                logger.warning("应用补丁时发生冲突")
+    # git apply 默认原子执行：任一文件无法应用时不会修改工作区
+    result = subprocess.run(
+        ["git", "apply", "-"],
+        input=patch_content.encode('utf-8'),
+        cwd=repo.working_dir,
+        capture_output=True
+    )
+    
+    if result.returncode == 0:
+        return {"status": "success"}
+    
+    error_message = result.stderr.decode('utf-8', errors='replace')
+    
+    # 检查是否因为冲突而失败
+    if "patch does not apply" in error_message:
+        logger.warning("应用补丁时发生冲突")
+        
+        # 尝试获取冲突文件
+        conflict_files_list = []
+        
+        # 尝试分析补丁内容找出文件名
+        affected_files = extract_files_from_patch(patch_content)
+        
+        # 对可能受影响的文件进行检查
+        for file_path in affected_files:
+            full_path = Path(repo.working_dir) / file_path
+            if full_path.exists():
+                # 读取当前内容
+                with open(full_path, 'rb') as f:
+                    current_content = f.read()
                 
-                # 尝试获取冲突文件
-                conflict_files_list = []
-                
-                # 尝试分析补丁内容找出文件名
-                affected_files = extract_files_from_patch(patch_content)
-                
-                # 对可能受影响的文件进行检查
-                for file_path in affected_files:
-                    full_path = Path(repo.working_dir) / file_path
-                    if full_path.exists():
-                        # 读取当前内容
-                        with open(full_path, 'rb') as f:
-                            current_content = f.read()
-                        
-                        conflict_files_list.append(GitConflictFile(
-                            path=file_path,
-                            remote_content=base64.b64encode(current_content).decode('utf-8')
-                        ))
-                
-                return {
-                    "success": False,
-                    "message": "应用补丁时发生冲突",
-                    "conflict_files": conflict_files_list
-                }
-            else:
-                return {"success": False, "message": str(e)}
+                conflict_files_list.append(GitConflictFile(
+                    path=file_path,
+                    remote_content=base64.b64encode(current_content).decode('utf-8')
+                ))
+        
+        return {
+            "status": "conflict",
+            "message": "应用补丁时发生冲突",
+            "conflicts": conflict_files_list
+        }
     
-    finally:
-        # 清理临时文件
-        if patch_file and os.path.exists(patch_file):
-            os.unlink(patch_file)
+    return {"status": "error", "message": error_message}
+
+
+# 补丁中标识文件的三种行：---/+++ 文件头、二进制文件说明、diff --git 行
+PATCH_FILE_PATTERN = re.compile(
+    r'^(?:(?:--- a/|\+\+\+ b/)(?P<header>[^\r\n]*)'
+    r'|Binary files a/(?P<binary>[^ \r\n]*)'
+    r'|diff --git a/(?P<diff>[^ \r\n]*) )',
+    re.MULTILINE
+)
 
 
 def extract_files_from_patch(patch_content: str) -> List[str]:
@@ -622,49 +771,31 @@ def extract_files_from_patch(patch_content: str) -> List[str]:
     Returns:
         文件路径列表
     """
-    files = []
+    # 按出现顺序去重
+    files = {}
     
     try:
-        # 解析补丁内容
-        lines = patch_content.splitlines()
-        current_file = None
-        
-        for line in lines:
-            # 尝试识别文件头
-            if line.startswith('--- a/') or line.startswith('+++ b/'):
-                # 提取路径部分
-                file_path = line[6:].strip()
+        # 单次正则扫描整个补丁，不再逐行拆分
+        for match in PATCH_FILE_PATTERN.finditer(patch_content):
+            header = match.group("header")
+            if header is not None:
+                file_path = header.strip()
                 
                 # 忽略/dev/null（表示文件创建或删除）
-                if file_path != '/dev/null' and file_path not in files:
-                    files.append(file_path)
-            
-            # 识别二进制文件
-            elif line.startswith('Binary files '):
-                # 格式通常是 "Binary files a/path/to/file and b/path/to/file differ"
-                parts = line.split(' ')
-                if len(parts) > 2:
-                    a_file = parts[2]
-                    if a_file.startswith('a/'):
-                        file_path = a_file[2:]
-                        if file_path not in files:
-                            files.append(file_path)
+                if file_path == '/dev/null':
+                    continue
+            else:
+                # "Binary files a/path and b/path differ" 或 "diff --git a/path b/path"
+                file_path = match.group("binary")
+                if file_path is None:
+                    file_path = match.group("diff")
             
-            # 识别diff --git行，作为备选
-            elif line.startswith('diff --git '):
-                # 格式通常是 "diff --git a/path/to/file b/path/to/file"
-                parts = line.split(' ')
-                if len(parts) >= 4:
-                    a_file = parts[2]
-                    if a_file.startswith('a/'):
-                        file_path = a_file[2:]
-                        if file_path not in files:
-                            files.append(file_path)
+            files[file_path] = None
     
     except Exception as e:
         logger.error(f"从补丁提取文件失败: {str(e)}")
     
-    return files
+    return list(files)
 
 
 def resolve_conflicts(path: str, resolutions: List[GitConflictResolution]) -> Dict[str, Any]:
@@ -681,47 +812,50 @@ def resolve_conflicts(path: str, resolutions: List[GitConflictResolution]) -> Di
     # 路径映射
     path = map_remote_path(path)
     
-    repo_path = Path(path)
+    repo_path = cached_path(path)
+    repo_key = str(repo_path)
     
     if not (repo_path / ".git").exists():
         return {"status": "error", "message": "目标路径不是Git仓库"}
     
     try:
-        repo = Repo(repo_path)
+        repo = get_sync_repo(repo_key)
         
         # 检查是否有记录的冲突
-        if str(repo_path) not in conflict_files or not conflict_files[str(repo_path)]:
+        repo_conflicts = conflict_files.get(repo_key)
+        if not repo_conflicts:
             return {"status": "error", "message": "没有需要解决的冲突"}
         
         # 按照解决方案处理冲突
         for resolution in resolutions:
             resolved = False
             
-            # 查找对应的冲突文件
-            for i, cf in enumerate(conflict_files[str(repo_path)]):
-                if cf.path == resolution.path:
-                    file_path = repo_path / cf.path
-                    
-                    if resolution.resolution == "local":
-                        # 使用本地版本，不做任何事
-                        resolved = True
-                    elif resolution.resolution == "remote":
-                        # 使用远程版本
-                        if cf.remote_content:
-                            with open(file_path, 'wb') as f:
-                                f.write(base64.b64decode(cf.remote_content))
-                            resolved = True
-                    elif resolution.resolution == "merged":
-                        # 使用合并版本
-                        if resolution.content:
-                            with open(file_path, 'wb') as f:
-                                f.write(base64.b64decode(resolution.content))
-                            resolved = True
-                    
-                    if resolved:
-                        # 从冲突列表中删除
-                        conflict_files[str(repo_path)].pop(i)
-                        break
+            # 按路径直接查找对应的冲突文件
+            cf = repo_conflicts.get(resolution.path)
+            if cf is None:
+                continue
+            
+            file_path = repo_path / cf.path
+            
+            if resolution.resolution == "local":
+                # 使用本地版本，不做任何事
+                resolved = True
+            elif resolution.resolution == "remote":
+                # 使用远程版本
+                if cf.remote_content:
+                    with open(file_path, 'wb') as f:
+                        f.write(base64.b64decode(cf.remote_content))
+                    resolved = True
+            elif resolution.resolution == "merged":
+                # 使用合并版本
+                if resolution.content:
+                    with open(file_path, 'wb') as f:
+                        f.write(base64.b64decode(resolution.content))
+                    resolved = True
+            
+            if resolved:
+                # 从冲突记录中删除
+                del repo_conflicts[resolution.path]
         
         # 添加解决后的文件
         for resolution in resolutions:
@@ -730,13 +864,12 @@ def resolve_conflicts(path: str, resolutions: List[GitConflictResolution]) -> Di
                 repo.git.add(str(file_path))
         
         # 如果没有冲突了，提交变更
-        if not conflict_files[str(repo_path)]:
+        if not repo_conflicts:
             commit = repo.index.commit("解决同步冲突")
             
             # 更新同步信息
-            if str(repo_path) in git_sync_info:
-                git_sync_info[str(repo_path)]["last_sync"] = time.time()
-                git_sync_info[str(repo_path)]["last_commit"] = str(commit)
+            if repo_key in git_sync_info:
+                record_sync_commit(repo_key, str(commit))
             
             return {
                 "status": "success",
@@ -748,7 +881,7 @@ def resolve_conflicts(path: str, resolutions: List[GitConflictResolution]) -> Di
             return {
                 "status": "partial",
                 "message": "部分冲突已解决",
-                "remaining_conflicts": len(conflict_files[str(repo_path)])
+                "remaining_conflicts": len(repo_conflicts)
             }
         
     except Exception as e:
@@ -769,13 +902,14 @@ def get_sync_status(path: str) -> Dict[str, Any]:
     # 路径映射
     path = map_remote_path(path)
     
-    repo_path = Path(path)
+    repo_path = cached_path(path)
+    repo_key = str(repo_path)
     
     if not (repo_path / ".git").exists():
         return {"status": "error", "message": "目标路径不是Git仓库"}
     
     try:
-        repo = Repo(repo_path)
+        repo = get_sync_repo(repo_key)
         
         # 检查是否有未提交的变更
         is_dirty = repo.is_dirty()
@@ -818,7 +952,7 @@ def get_sync_status(path: str) -> Dict[str, Any]:
             "commit_message": commit_message,
             "current_branch": current_branch,
             "file_status": status,
-            "conflict_files": len(conflict_files.get(str(repo_path), [])) if str(repo_path) in conflict_files else 0
+            "conflict_files": len(conflict_files.get(repo_key, []))
         }
         
     except Exception as e:
@@ -839,14 +973,16 @@ def get_conflicts(path: str) -> Dict[str, Any]:
     # 路径映射
     path = map_remote_path(path)
     
-    repo_path = Path(path)
+    repo_path = cached_path(path)
+    repo_key = str(repo_path)
     
     if not (repo_path / ".git").exists():
         return {"status": "error", "message": "目标路径不是Git仓库"}
     
     try:
         # 检查是否有记录的冲突
-        if str(repo_path) not in conflict_files or not conflict_files[str(repo_path)]:
+        repo_conflicts = conflict_files.get(repo_key)
+        if not repo_conflicts:
             return {
                 "status": "success",
                 "conflicts": []
@@ -854,7 +990,7 @@ def get_conflicts(path: str) -> Dict[str, Any]:
         
         # 获取冲突文件列表
         conflicts = []
-        for cf in conflict_files[str(repo_path)]:
+        for cf in repo_conflicts.values():
             file_path = repo_path / cf.path
             
             # 如果文件不存在，跳过
@@ -863,7 +999,7 @@ def get_conflicts(path: str) -> Dict[str, Any]:
             
             conflicts.append({
                 "path": cf.path,
-                "content": cf.content
+                "content": cf.remote_content
             })
         
         return {
@@ -879,37 +1015,166 @@ CACHE_FILE = Path(__file__).parent / ".remote_cache.json" # Cache file path
 
 
 # WebSocket连接管理
+SEND_QUEUE_SIZE = 256  # 每个连接待发送消息队列的最大长度
+SEND_TIMEOUT = 5.0  # 单条消息发送超时(秒)，超时视为连接已停滞
+
+
 class ConnectionManager:
     """管理WebSocket连接"""
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.queues: Dict[WebSocket, asyncio.Queue] = {}  # 每个连接的待发送队列
+        self.relay_tasks: Dict[WebSocket, asyncio.Task] = {}  # 每个连接的发送任务
+        self.close_tasks: set = set()  # 正在关闭积压连接的任务，保持引用直到完成
 
     async def connect(self, websocket: WebSocket):
         """处理新的WebSocket连接"""
         await websocket.accept()
         self.active_connections.append(websocket)
+        
+        # 每个连接由独立任务发送消息，慢连接只会积压自己的队列
+        queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.queues[websocket] = queue
+        self.relay_tasks[websocket] = asyncio.create_task(self._relay(websocket, queue))
         logger.info(f"WebSocket连接已建立")
 
     def disconnect(self, websocket: WebSocket):
         """处理WebSocket断开连接"""
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        self.queues.pop(websocket, None)
+        
+        task = self.relay_tasks.pop(websocket, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
         logger.info(f"WebSocket连接已断开")
 
+    async def _relay(self, websocket: WebSocket, queue: asyncio.Queue):
+        """将队列中的消息依次发送到连接"""
+        try:
+            while True:
+                payload = await queue.get()
+                await asyncio.wait_for(websocket.send_bytes(payload), timeout=SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket发送超时，关闭连接")
+            self.disconnect(websocket)
+            await self._close(websocket)
+        except Exception as e:
+            logger.warning(f"WebSocket发送失败，关闭连接: {str(e)}")
+            self.disconnect(websocket)
+            await self._close(websocket)
+
+    async def _close(self, websocket: WebSocket):
+        """
+        关闭已移除的连接
+        
+        发送被取消后连接上可能残留半个帧，只移除而不关闭时对端仍认为订阅有效；
+        关闭后客户端可以发现断开并重连。关闭本身失败（连接已断开等）时忽略。
+        """
+        try:
+            await asyncio.wait_for(websocket.close(code=1011), timeout=SEND_TIMEOUT)
+        except Exception:
+            pass
+
     async def broadcast(self, message: dict):
         """向所有连接广播消息"""
-        for connection in self.active_connections:
-            await connection.send_json(message)
-        logger.debug(f"消息已广播: {message}")
+        self.broadcast_nowait(message)
+
+    async def broadcast_raw(self, payload: bytes):
+        """向所有连接广播已序列化的JSON消息"""
+        self.broadcast_raw_nowait(payload)
+
+    def broadcast_nowait(self, message: dict):
+        """同步入队广播消息，可在定时回调等非协程上下文中调用"""
+        # 只序列化一次，所有连接共享同一份负载
+        self.broadcast_raw_nowait(orjson.dumps(message))
+
+    def broadcast_raw_nowait(self, payload: bytes):
+        """同步入队已序列化的JSON消息"""
+        # 只入队不等待发送；队列已满说明连接跟不上，丢弃消息会让客户端静默丢失
+        # 输出和文件变更，因此关闭该连接，由客户端重连或改为HTTP获取最新状态
+        for websocket, queue in list(self.queues.items()):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                logger.warning(f"WebSocket待发送消息积压，关闭连接")
+                self.disconnect(websocket)
+                task = asyncio.get_running_loop().create_task(self._close(websocket))
+                self.close_tasks.add(task)
+                task.add_done_callback(self.close_tasks.discard)
+        
+        logger.debug("消息已广播: %s", payload)
 
 
 manager = ConnectionManager()
 
+# 单条files_changed消息最多携带的文件数
+FILES_CHANGED_BATCH_SIZE = 50
+
+# 批量同步时同时处理的最大文件数
+SYNC_CONCURRENCY = 32
+
+# 单文件变更消息的固定部分，只有路径需要按请求序列化
+FILE_CHANGED_PREFIX = b'{"type":"file_changed","action":"updated","path":'
+FILE_CHANGED_SUFFIX = b'}'
+
+# 心跳响应内容固定，预先序列化
+PONG_MESSAGE = orjson.dumps({"type": "pong"})
+
+
+async def broadcast_file_changed(path: str):
+    """
+    广播单个文件的变更事件
+    
+    Args:
+        path: 变更的文件路径
+    """
+    # orjson负责路径中引号、控制字符等的转义
+    await manager.broadcast_raw(FILE_CHANGED_PREFIX + orjson.dumps(path) + FILE_CHANGED_SUFFIX)
+
+
+async def broadcast_files_changed(files: List[Dict[str, str]]):
+    """
+    广播批量文件变更事件
+    
+    批量同步时将所有变更合并为少量files_changed消息，而不是每个文件广播一次
+    
+    Args:
+        files: 变更文件列表，每项至少包含path
+    """
+    for i in range(0, len(files), FILES_CHANGED_BATCH_SIZE):
+        await manager.broadcast({
+            "type": "files_changed",
+            "action": "updated",
+            "files": files[i:i + FILES_CHANGED_BATCH_SIZE]
+        })
+
 
 # 辅助函数
+@lru_cache(maxsize=4096)
+def _format_utc_seconds(seconds: int) -> str:
+    """格式化整秒UTC时间戳，同一秒内的多次格式化复用结果"""
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+
+
+def format_timestamp(timestamp: float) -> str:
+    """
+    将时间戳格式化为ISO 8601 UTC字符串（精确到秒）
+    
+    Args:
+        timestamp: Unix时间戳
+        
+    Returns:
+        形如2024-01-01T00:00:00Z的字符串
+    """
+    return _format_utc_seconds(math.floor(timestamp))
+
+
 def get_file_info(path: str) -> FileInfo:
     """获取文件信息"""
-    file_path = Path(path)
+    file_path = cached_path(path)
     if not file_path.exists():
         raise HTTPException(status_code=404, detail=f"文件或目录不存在: {path}")
     
@@ -926,8 +1191,108 @@ def get_file_info(path: str) -> FileInfo:
             path=str(file_path),
             type="file",
             size=stats.st_size,
-            last_modified=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(stats.st_mtime))
+            last_modified=format_timestamp(stats.st_mtime)
+        )
+
+
+def get_file_info_from_entry(entry: os.DirEntry) -> FileInfo:
+    """根据os.scandir返回的目录项获取文件信息，复用目录项缓存的类型和stat结果"""
+    if entry.is_dir():
+        return FileInfo(
+            name=entry.name,
+            path=entry.path,
+            type="directory"
         )
+    
+    try:
+        stats = entry.stat()
+    except FileNotFoundError:
+        # 失效的符号链接，使用链接本身的信息
+        stats = entry.stat(follow_symlinks=False)
+    
+    return FileInfo(
+        name=entry.name,
+        path=entry.path,
+        type="file",
+        size=stats.st_size,
+        last_modified=format_timestamp(stats.st_mtime)
+    )
+
+
+def _list_dir_sync(path: str) -> List[FileInfo]:
+    """列出目录内容，每个文件最多一次stat"""
+    with os.scandir(path) as entries:
+        return [get_file_info_from_entry(entry) for entry in entries]
+
+
+def _read_bytes_sync(path: Union[str, Path]) -> bytes:
+    """在工作线程中一次完成打开和读取"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write_bytes_sync(path: Union[str, Path], data) -> None:
+    """在工作线程中一次完成打开和写入"""
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _write_base64_sync(path: Union[str, Path], encoded: str) -> bytes:
+    """在工作线程中解码Base64内容并写入文件，返回解码后的内容"""
+    content = b64decode(encoded)
+    _write_bytes_sync(path, content)
+    return content
+
+
+def _content_checksum(content: bytes, algorithm: str) -> str:
+    """
+    计算上传内容的校验和
+    
+    Args:
+        content: 文件内容
+        algorithm: 校验和算法，取值见CHECKSUM_ALGORITHMS
+        
+    Returns:
+        十六进制校验和
+    """
+    if algorithm == "blake3":
+        return blake3(content).hexdigest()
+    return hashlib.md5(content).hexdigest()
+
+
+def _new_checksum_hasher(algorithm: str):
+    """创建上传内容校验和的增量哈希对象"""
+    if algorithm == "blake3":
+        return blake3()
+    return hashlib.md5()
+
+
+def _check_checksum_algorithm(algorithm: str) -> None:
+    """校验和算法不受支持时返回400"""
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise HTTPException(status_code=400, detail=f"不支持的校验和算法: {algorithm}")
+
+
+def _decode_base64_content(encoded: str, checksum_algorithm: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    解码Base64内容，可选同时计算校验和
+    
+    Args:
+        encoded: Base64编码的内容
+        checksum_algorithm: 校验和算法，为None时不计算
+        
+    Returns:
+        (解码后的内容, 校验和或None)
+    """
+    content = b64decode(encoded)
+    checksum = _content_checksum(content, checksum_algorithm) if checksum_algorithm else None
+    return content, checksum
+
+
+def _encode_base64_text(data: bytes) -> str:
+    """Base64编码为字符串，中间的bytes结果在返回前即释放"""
+    # Base64输出只含ASCII字符，按ASCII解码即可
+    return base64.b64encode(data).decode('ascii')
 
 
 async def read_file_content(path: str) -> dict:
@@ -935,7 +1300,7 @@ async def read_file_content(path: str) -> dict:
     # 路径映射
     path = map_remote_path(path)
     
-    file_path = Path(path)
+    file_path = cached_path(path)
     if not file_path.exists():
         raise HTTPException(status_code=404, detail=f"文件不存在: {path}")
     
@@ -944,22 +1309,27 @@ async def read_file_content(path: str) -> dict:
     
     try:
         stats = file_path.stat()
-        async with aiofiles.open(file_path, 'rb') as f:
-            content = await f.read()
+        content = await asyncio.to_thread(_read_bytes_sync, file_path)
         
-        # 计算MD5校验和
-        checksum = hashlib.md5(content).hexdigest()
+        # 文件未变化时直接使用缓存的元数据，否则从已读入的内容生成
+        metadata = get_cached_metadata(str(file_path))
+        if metadata is None:
+            metadata = await generate_file_metadata(str(file_path), content)
         
-        # Base64编码内容
-        encoded_content = base64.b64encode(content).decode('utf-8')
+        # 计算MD5校验和（元数据本身使用MD5时可直接复用完整哈希）
+        if SERVER_CONFIG["hash_algorithm"] == "md5":
+            checksum = metadata["full_hash"]
+        else:
+            checksum = hashlib.md5(content).hexdigest()
         
-        # 生成文件元数据
-        metadata = await generate_file_metadata(str(file_path), content)
+        # Base64编码内容（大文件编码耗时较长，放到线程池中进行）
+        encoded_content = await asyncio.to_thread(_encode_base64_text, content)
+        del content
         
         return {
             "content": encoded_content,
             "path": str(file_path),
-            "last_modified": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(stats.st_mtime)),
+            "last_modified": format_timestamp(stats.st_mtime),
             "checksum": checksum,
             "metadata": metadata
         }
@@ -972,40 +1342,22 @@ async def write_file_content(file_content: FileContent) -> dict:
     """写入文件内容"""
     # 路径映射
     file_content.path = map_remote_path(file_content.path)
-    file_path = Path(file_content.path)
+    file_path = cached_path(file_content.path)
     
     # 确保父目录存在
     file_path.parent.mkdir(parents=True, exist_ok=True)
     
     try:
-        # 解码Base64内容
-        content = base64.b64decode(file_content.content)
-        
-        # 如果提供了校验和，进行验证
-        if file_content.checksum:
-            calculated_checksum = hashlib.md5(content).hexdigest()
-            if calculated_checksum != file_content.checksum:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"校验和不匹配: 期望 {file_content.checksum}, 实际 {calculated_checksum}"
-                )
-        
-        # 写入文件
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
-        
-        # 获取更新后的文件信息
-        stats = file_path.stat()
-        
-        # 更新文件元数据
-        metadata = await generate_file_metadata(str(file_path), content)
+        checksum_algorithm = file_content.checksum_algorithm if file_content.checksum else None
+        if checksum_algorithm:
+            _check_checksum_algorithm(checksum_algorithm)
         
-        return {
-            "status": "success",
-            "path": str(file_path),
-            "last_modified": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(stats.st_mtime)),
-            "metadata": metadata
-        }
+        # 解码Base64内容（提供了校验和时一并计算），在线程池中进行以免阻塞事件循环
+        content, calculated_checksum = await asyncio.to_thread(
+            _decode_base64_content, file_content.content, checksum_algorithm
+        )
+        return await _store_file_content(file_path, content, file_content.checksum,
+                                         calculated_checksum, checksum_algorithm)
     except HTTPException:
         raise
     except Exception as e:
@@ -1013,56 +1365,307 @@ async def write_file_content(file_content: FileContent) -> dict:
         raise HTTPException(status_code=500, detail=f"写入文件失败: {str(e)}")
 
 
-async def execute_command(command_request: CommandRequest) -> str:
-    """在后台执行命令"""
-    command_id = str(uuid.uuid4())
-    command = command_request.command
-    working_dir = command_request.working_directory
-    env = command_request.environment or {}
-    timeout = command_request.timeout or 300
+async def write_raw_file_content(path: str, content: bytes, checksum: Optional[str] = None,
+                                 checksum_algorithm: str = "md5") -> dict:
+    """
+    写入未经Base64编码的文件内容
     
-    # 记录命令信息
-    active_commands[command_id] = {
-        "command": command,
-        "working_directory": working_dir,
-        "status": "pending",
-        "start_time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time())),
-        "end_time": None,
-        "exit_code": None,
-        "output": "",
-        "process": None
-    }
+    Args:
+        path: 文件路径
+        content: 原始文件内容
+        checksum: 可选的校验和
+        checksum_algorithm: 校验和算法，取值见CHECKSUM_ALGORITHMS
+        
+    Returns:
+        写入结果字典
+    """
+    file_path = cached_path(map_remote_path(path))
     
-    # 异步执行命令
-    asyncio.create_task(run_command(command_id, command, working_dir, env, timeout))
+    # 确保父目录存在
+    file_path.parent.mkdir(parents=True, exist_ok=True)
     
-    return command_id
+    try:
+        calculated_checksum = None
+        if checksum:
+            _check_checksum_algorithm(checksum_algorithm)
+            calculated_checksum = await asyncio.to_thread(_content_checksum, content, checksum_algorithm)
+        else:
+            checksum_algorithm = None
+        return await _store_file_content(file_path, content, checksum, calculated_checksum, checksum_algorithm)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"写入文件失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"写入文件失败: {str(e)}")
 
 
-async def run_command(command_id: str, command: str, working_dir: str, env: dict, timeout: int):
-    """运行命令并捕获输出"""
-    try:
-        # 更新命令状态
-        active_commands[command_id]["status"] = "running"
+# 超过该大小(或未声明长度)的原始上传边接收边写入临时文件，内存占用与文件大小无关
+STREAM_UPLOAD_THRESHOLD = 8 * 1024 * 1024
+STREAM_WRITE_SIZE = 1024 * 1024  # 流式上传时每次写盘的数据量
+
+
+def _write_and_hash(f, data: bytes, hasher) -> None:
+    """在工作线程中写入一段上传数据并更新校验和"""
+    if hasher is not None:
+        hasher.update(data)
+    f.write(data)
+
+
+async def write_raw_file_stream(path: str, stream: AsyncIterator[bytes], checksum: Optional[str] = None,
+                                checksum_algorithm: str = "md5") -> dict:
+    """
+    流式写入未经Base64编码的文件内容
+    
+    内容先写入同目录下的临时文件，校验通过后再替换目标文件，
+    校验失败或连接中断时原文件保持不变。
+    
+    Args:
+        path: 文件路径
+        stream: 请求体数据块的异步迭代器
+        checksum: 可选的校验和
+        checksum_algorithm: 校验和算法，取值见CHECKSUM_ALGORITHMS
         
-        # 设置环境变量
-        cmd_env = os.environ.copy()
+    Returns:
+        写入结果字典
+    """
+    file_path = cached_path(map_remote_path(path))
+    hasher = None
+    if checksum:
+        _check_checksum_algorithm(checksum_algorithm)
+        hasher = _new_checksum_hasher(checksum_algorithm)
+    
+    # 确保父目录存在
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}.upload")
+    
+    try:
+        f = await asyncio.to_thread(open, temp_path, 'wb')
+        try:
+            buffer = bytearray()
+            async for chunk in stream:
+                buffer += chunk
+                if len(buffer) >= STREAM_WRITE_SIZE:
+                    await asyncio.to_thread(_write_and_hash, f, bytes(buffer), hasher)
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(_write_and_hash, f, bytes(buffer), hasher)
+        finally:
+            await asyncio.to_thread(f.close)
+        
+        if hasher is not None and hasher.hexdigest() != checksum:
+            raise HTTPException(
+                status_code=400,
+                detail=f"校验和不匹配: 期望 {checksum}, 实际 {hasher.hexdigest()}"
+            )
+        
+        # 保留原文件的权限
+        if file_path.exists():
+            shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except HTTPException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    except Exception as e:
+        temp_path.unlink(missing_ok=True)
+        logger.error(f"写入文件失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"写入文件失败: {str(e)}")
+    
+    # 从磁盘流式计算元数据
+    file_metadata_cache.pop(str(file_path), None)
+    metadata = await generate_file_metadata(str(file_path))
+    
+    return {
+        "status": "success",
+        "path": str(file_path),
+        "last_modified": format_timestamp(metadata["mtime"]),
+        "metadata": metadata
+    }
+
+
+async def _store_file_content(file_path: Path, content: bytes, checksum: Optional[str],
+                              calculated_checksum: Optional[str],
+                              checksum_algorithm: Optional[str] = None) -> dict:
+    """
+    校验并写入已解码的文件内容，内容与磁盘上一致时跳过写入
+    
+    Args:
+        file_path: 文件路径
+        content: 文件内容
+        checksum: 客户端提供的校验和
+        calculated_checksum: 服务端计算的校验和，未提供checksum时为None
+        checksum_algorithm: 校验和算法，未提供checksum时为None
+        
+    Returns:
+        写入结果字典
+    """
+    # 如果提供了校验和，进行验证
+    if checksum and calculated_checksum != checksum:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"校验和不匹配: 期望 {checksum}, 实际 {calculated_checksum}"
+        )
+    
+    # 内容与磁盘上的文件相同（编辑器自动保存、客户端重试等）时跳过写入
+    cached_metadata = get_cached_metadata(str(file_path))
+    if cached_metadata and cached_metadata["size"] == len(content):
+        # 校验和与元数据使用同一算法时可复用已计算的校验和
+        if checksum_algorithm == SERVER_CONFIG["hash_algorithm"] and calculated_checksum is not None:
+            content_hash = calculated_checksum
+        else:
+            content_hash = _metadata_hasher()(content).hexdigest()
+        if content_hash == cached_metadata["full_hash"]:
+            return {
+                "status": "success",
+                "path": str(file_path),
+                "last_modified": format_timestamp(cached_metadata["mtime"]),
+                "metadata": cached_metadata,
+                "skipped": True
+            }
+    
+    # 写入文件
+    await asyncio.to_thread(_write_bytes_sync, file_path, content)
+    
+    # 获取更新后的文件信息
+    stats = file_path.stat()
+    
+    # 更新文件元数据
+    metadata = await generate_file_metadata(str(file_path), content)
+    
+    return {
+        "status": "success",
+        "path": str(file_path),
+        "last_modified": format_timestamp(stats.st_mtime),
+        "metadata": metadata
+    }
+
+
+async def execute_command(command_request: CommandRequest) -> str:
+    """在后台执行命令"""
+    command_id = str(uuid.uuid4())
+    command = command_request.command
+    working_dir = command_request.working_directory
+    env = command_request.environment or {}
+    timeout = command_request.timeout or 300
+    
+    # 记录命令信息
+    active_commands[command_id] = {
+        "command": command,
+        "working_directory": working_dir,
+        "status": "pending",
+        "start_time": format_timestamp(time.time()),
+        "end_time": None,
+        "exit_code": None,
+        "output": [],  # 输出片段列表，读取时再拼接
+        "output_ends": [],  # 各输出片段结束位置(字符)，按偏移读取时二分查找起始片段
+        "process": None,
+        "finished_at": None  # 结束时间戳，用于清理过期命令
+    }
+    
+    # 异步执行命令
+    asyncio.create_task(run_command(command_id, command, working_dir, env, timeout, command_request.argv))
+    
+    return command_id
+
+
+async def cleanup_finished_commands():
+    """定期清理结束超过COMMAND_RETENTION_SECONDS的命令记录，避免active_commands无限增长"""
+    while True:
+        await asyncio.sleep(COMMAND_CLEANUP_INTERVAL)
+        
+        expire_before = time.time() - COMMAND_RETENTION_SECONDS
+        expired = [
+            command_id for command_id, command_info in active_commands.items()
+            if command_info["finished_at"] is not None and command_info["finished_at"] < expire_before
+        ]
+        for command_id in expired:
+            del active_commands[command_id]
+        
+        if expired:
+            logger.info(f"已清理{len(expired)}条过期命令记录")
+
+
+def append_command_output(command_info: dict, text: str) -> None:
+    """
+    追加命令输出片段并记录其结束位置
+    
+    Args:
+        command_info: 命令信息
+        text: 输出片段
+    """
+    ends = command_info["output_ends"]
+    command_info["output"].append(text)
+    ends.append((ends[-1] if ends else 0) + len(text))
+
+
+def get_command_output_text(command_info: dict, offset: int = 0) -> Tuple[str, int]:
+    """
+    获取命令在指定位置之后的输出
+    
+    按片段结束位置二分查找起始片段，只拼接offset之后的片段，
+    增量轮询的开销与新增输出的长度相关，而不是与完整输出的长度相关。
+    
+    Args:
+        command_info: 命令信息
+        offset: 起始位置(字符)
+        
+    Returns:
+        (offset之后的输出文本, 完整输出的长度)
+    """
+    chunks = command_info["output"]
+    ends = command_info["output_ends"]
+    length = ends[-1] if ends else 0
+    
+    index = bisect.bisect_right(ends, offset)
+    if index >= len(chunks):
+        return "", length
+    
+    # 起始片段只取offset之后的部分
+    start = ends[index] - len(chunks[index])
+    head = chunks[index][offset - start:] if offset > start else chunks[index]
+    return head + "".join(chunks[index + 1:]), length
+
+
+# 命令输出合并广播的时间窗口(秒)和大小上限(字符)
+OUTPUT_FLUSH_INTERVAL = 0.05
+OUTPUT_FLUSH_SIZE = 16 * 1024
+STREAM_READ_SIZE = 64 * 1024  # 每次从子进程管道读取的最大字节数
+
+
+async def run_command(command_id: str, command: str, working_dir: str, env: dict, timeout: int,
+                      argv: Optional[List[str]] = None):
+    """运行命令并捕获输出"""
+    command_info = active_commands[command_id]
+    try:
+        # 更新命令状态
+        command_info["status"] = "running"
+        
+        # 设置环境变量
+        cmd_env = os.environ.copy()
         for key, value in env.items():
             cmd_env[key] = str(value)
         
         # 创建目录（如果不存在）
         os.makedirs(working_dir, exist_ok=True)
         
-        # 启动进程
-        process = await asyncio.create_subprocess_shell(
-            command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=working_dir,
-            env=cmd_env
-        )
+        # 启动进程；提供了参数列表时直接exec，省去额外的shell进程
+        if argv:
+            process = await asyncio.create_subprocess_exec(
+                *argv,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=working_dir,
+                env=cmd_env
+            )
+        else:
+            process = await asyncio.create_subprocess_shell(
+                command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=working_dir,
+                env=cmd_env
+            )
         
-        active_commands[command_id]["process"] = process
+        command_info["process"] = process
         
         # 读取标准输出和标准错误
         stdout_task = asyncio.create_task(read_stream(process.stdout, command_id, "stdout"))
@@ -1071,11 +1674,11 @@ async def run_command(command_id: str, command: str, working_dir: str, env: dict
         # 等待命令执行完成或超时
         try:
             exit_code = await asyncio.wait_for(process.wait(), timeout=timeout)
-            active_commands[command_id]["exit_code"] = exit_code
-            active_commands[command_id]["status"] = "completed"
+            command_info["exit_code"] = exit_code
+            command_info["status"] = "completed"
         except asyncio.TimeoutError:
             # 命令执行超时
-            active_commands[command_id]["status"] = "timeout"
+            command_info["status"] = "timeout"
             process.terminate()
             await asyncio.sleep(1)
             if process.returncode is None:
@@ -1085,66 +1688,399 @@ async def run_command(command_id: str, command: str, working_dir: str, env: dict
         await asyncio.gather(stdout_task, stderr_task)
         
         # 更新结束时间
-        active_commands[command_id]["end_time"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time()))
+        command_info["finished_at"] = time.time()
+        command_info["end_time"] = format_timestamp(command_info["finished_at"])
         
         # 广播命令完成通知
         await manager.broadcast({
             "type": "command_completed",
             "command_id": command_id,
-            "status": active_commands[command_id]["status"],
-            "exit_code": active_commands[command_id]["exit_code"]
+            "status": command_info["status"],
+            "exit_code": command_info["exit_code"]
         })
         
     except Exception as e:
         # 处理命令执行过程中的异常
         logger.error(f"命令执行错误: {str(e)}")
-        active_commands[command_id]["status"] = "failed"
-        active_commands[command_id]["output"] += f"\n执行错误: {str(e)}"
-        active_commands[command_id]["end_time"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time()))
+        command_info["status"] = "failed"
+        error_text = f"\n执行错误: {str(e)}"
+        append_command_output(command_info, error_text)
+        command_info["finished_at"] = time.time()
+        command_info["end_time"] = format_timestamp(command_info["finished_at"])
+        
+        # 同样广播失败通知，等待推送的客户端不会一直等下去
+        await manager.broadcast({
+            "type": "command_output",
+            "command_id": command_id,
+            "stream": "stderr",
+            "content": error_text
+        })
+        await manager.broadcast({
+            "type": "command_completed",
+            "command_id": command_id,
+            "status": command_info["status"],
+            "exit_code": command_info["exit_code"]
+        })
 
 
 async def read_stream(stream, command_id: str, stream_name: str):
-    """读取流内容并更新命令输出"""
-    output_buffer = []
+    """
+    读取流内容并更新命令输出
     
-    while True:
-        line = await stream.readline()
-        if not line:
-            break
-        
-        line_text = line.decode('utf-8', errors='replace')
-        output_buffer.append(line_text)
-        active_commands[command_id]["output"] += line_text
-        
-        # 广播输出更新通知
-        await manager.broadcast({
+    按块读取输出并增量解码，输出片段按时间窗口和大小合并后再广播，
+    避免大量输出时每行一条WebSocket消息。
+    """
+    command_info = active_commands[command_id]
+    loop = asyncio.get_running_loop()
+    
+    # 增量解码器保证跨块截断的多字节字符被正确拼接
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    
+    pending = []  # 尚未广播的输出片段
+    pending_size = 0
+    flush_handle = None  # 合并窗口结束时触发广播的定时器
+    
+    def flush():
+        nonlocal pending_size, flush_handle
+        if flush_handle is not None:
+            flush_handle.cancel()
+            flush_handle = None
+        if not pending:
+            return
+        content = "".join(pending)
+        pending.clear()
+        pending_size = 0
+        
+        # 广播输出更新通知（同步入队，保证各批次顺序）
+        manager.broadcast_nowait({
             "type": "command_output",
             "command_id": command_id,
             "stream": stream_name,
-            "content": line_text
+            "content": content
         })
+    
+    try:
+        while True:
+            chunk = await stream.read(STREAM_READ_SIZE)
+            final = not chunk
+            text = decoder.decode(chunk, final=final)
+            
+            if text:
+                append_command_output(command_info, text)
+                pending.append(text)
+                pending_size += len(text)
+                
+                if pending_size >= OUTPUT_FLUSH_SIZE:
+                    flush()
+                elif flush_handle is None:
+                    flush_handle = loop.call_later(OUTPUT_FLUSH_INTERVAL, flush)
+            
+            if final:
+                break
+    finally:
+        flush()
 
 
 # 增量同步相关函数
-async def generate_file_metadata(file_path: str, content: Optional[bytes] = None) -> Dict:
+BLOCK_SIZE = 4096  # 元数据块哈希与增量同步使用的块大小(字节)
+_buf_pool = {}  # 缓冲区大小(2的幂) -> 空闲bytearray列表
+_buf_pool_lock = threading.Lock()
+BUF_POOL_MAX_PER_SIZE = 8  # 每种大小最多保留的空闲缓冲区数
+
+# 内容达到该大小时，块哈希分段交给线程池并行计算（hashlib计算时释放GIL）
+HASH_PARALLEL_THRESHOLD = 2 * 1024 * 1024
+HASH_BLOCKS_PER_TASK = 256  # 每个并行任务负责的块数
+# 增量块数达到该值且pybase64可用时，分段交给线程池并行解码（pybase64解码时释放GIL）
+DECODE_PARALLEL_THRESHOLD = 256
+DECODE_BLOCKS_PER_TASK = 64  # 每个并行解码任务负责的块数
+_hash_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="block-hash")
+
+
+def _get_buf(size: int) -> bytearray:
+    """
+    从缓冲池获取至少size字节的bytearray
+    
+    Args:
+        size: 需要的最小字节数
+        
+    Returns:
+        长度为不小于size的2的幂的缓冲区，内容未清零
+    """
+    bucket = 1 << (size - 1).bit_length()
+    with _buf_pool_lock:
+        free_list = _buf_pool.get(bucket)
+        if free_list:
+            return free_list.pop()
+    return bytearray(bucket)
+
+
+def _put_buf(buf: bytearray) -> None:
+    """将缓冲区归还到缓冲池"""
+    with _buf_pool_lock:
+        free_list = _buf_pool.setdefault(len(buf), [])
+        if len(free_list) < BUF_POOL_MAX_PER_SIZE:
+            free_list.append(buf)
+
+
+def _metadata_hasher():
+    """返回当前配置的元数据哈希算法构造函数"""
+    return getattr(hashlib, SERVER_CONFIG["hash_algorithm"])
+
+
+def _stream_file_hashes(file_path: str, block_size: int) -> Tuple[str, Dict[str, str]]:
+    """
+    流式计算文件的完整哈希和块哈希
+    
+    完整哈希优先使用hashlib.file_digest（Python 3.11+），在C层缓冲读取并释放GIL；
+    块哈希按1MB读取后在memoryview上切分，内存占用与文件大小无关。
+    
+    Args:
+        file_path: 文件路径
+        block_size: 块大小(字节)
+        
+    Returns:
+        (完整哈希, 块索引 -> 哈希值)
+    """
+    blocks = {}
+    full_hasher = None
+    new_hasher = _metadata_hasher()
+    # 读取大小取块大小的整数倍，保证块边界对齐
+    chunk_size = block_size * 256
+    
+    buf = _get_buf(chunk_size)
+    try:
+        with open(file_path, 'rb') as f, memoryview(buf) as buf_view:
+            if hasattr(hashlib, "file_digest"):
+                # 直接在底层无缓冲文件对象上计算，跳过BufferedReader的额外拷贝
+                full_hash = hashlib.file_digest(f.raw, new_hasher).hexdigest()
+                f.seek(0)
+            else:
+                full_hasher = new_hasher()
+            
+            block_index = 0
+            while True:
+                # 读入复用的缓冲区，避免每次读取都分配新的bytes对象
+                n = f.readinto(buf_view[:chunk_size])
+                if not n:
+                    break
+                
+                chunk = buf_view[:n]
+                if full_hasher is not None:
+                    full_hasher.update(chunk)
+                
+                for i in range(0, n, block_size):
+                    blocks[str(block_index)] = new_hasher(chunk[i:i+block_size]).hexdigest()
+                    block_index += 1
+    finally:
+        _put_buf(buf)
+    
+    if full_hasher is not None:
+        full_hash = full_hasher.hexdigest()
+    
+    return full_hash, blocks
+
+
+def _hash_block_range(view: memoryview, start: int, end: int, block_size: int,
+                      new_hasher) -> List[str]:
+    """
+    计算内容中一段连续块的哈希
+    
+    Args:
+        view: 文件内容的memoryview
+        start: 起始偏移（块对齐）
+        end: 结束偏移
+        block_size: 块大小(字节)
+        new_hasher: 哈希构造函数
+        
+    Returns:
+        按块顺序排列的哈希值列表
+    """
+    # memoryview切片不复制数据，避免每个块分配新的bytes对象
+    return [new_hasher(view[i:i+block_size]).hexdigest() for i in range(start, end, block_size)]
+
+
+def _hash_content_blocks(content: bytes, block_size: int) -> Tuple[str, Dict[str, str]]:
+    """
+    计算内存中内容的完整哈希和块哈希
+    
+    大文件的块哈希按段分发到线程池并行计算，完整哈希同时在池中进行。
+    
+    Args:
+        content: 文件内容
+        block_size: 块大小(字节)
+        
+    Returns:
+        (完整哈希, 块索引 -> 哈希值)
+    """
+    new_hasher = _metadata_hasher()
+    
+    with memoryview(content) as view:
+        size = len(view)
+        if size >= HASH_PARALLEL_THRESHOLD:
+            span = block_size * HASH_BLOCKS_PER_TASK
+            full_future = _hash_pool.submit(lambda: new_hasher(view).hexdigest())
+            futures = [
+                _hash_pool.submit(_hash_block_range, view, start, min(start + span, size), block_size, new_hasher)
+                for start in range(0, size, span)
+            ]
+            digests = [digest for future in futures for digest in future.result()]
+            full_hash = full_future.result()
+        else:
+            # 完整哈希一次性计算，不再逐块update
+            full_hash = new_hasher(view).hexdigest()
+            digests = _hash_block_range(view, 0, size, block_size, new_hasher)
+    
+    blocks = {str(block_index): digest for block_index, digest in enumerate(digests)}
+    return full_hash, blocks
+
+
+def _rehash_changed_blocks(file_path: str, blocks: Dict[str, str], changed_indices: set,
+                           block_size: int) -> Tuple[str, Dict[str, str]]:
+    """
+    只重新计算变更块的哈希，其余块沿用已有结果
+    
+    Args:
+        file_path: 文件路径
+        blocks: 变更前的块哈希
+        changed_indices: 发生变更的块索引集合
+        block_size: 块大小(字节)
+        
+    Returns:
+        (完整哈希, 块索引 -> 哈希值)
+    """
+    blocks = dict(blocks)
+    new_hasher = _metadata_hasher()
+    
+    with open(file_path, 'rb') as f:
+        for block_index in sorted(changed_indices):
+            f.seek(block_index * block_size)
+            block_data = f.read(block_size)
+            if block_data:
+                blocks[str(block_index)] = new_hasher(block_data).hexdigest()
+            else:
+                blocks.pop(str(block_index), None)
+        
+        # 完整哈希仍需覆盖整个文件，由C层流式计算
+        f.seek(0)
+        if hasattr(hashlib, "file_digest"):
+            full_hash = hashlib.file_digest(f, new_hasher).hexdigest()
+        else:
+            full_hasher = new_hasher()
+            for chunk in iter(lambda: f.read(block_size * 256), b""):
+                full_hasher.update(chunk)
+            full_hash = full_hasher.hexdigest()
+    
+    return full_hash, blocks
+
+
+def _touched_block_indices(extents: List[Tuple[int, int]], old_size: int, new_size: int,
+                           block_size: int) -> set:
+    """
+    计算写入数据块后内容发生变化的块索引
+    
+    Args:
+        extents: 已写入的 (起始偏移, 长度) 列表
+        old_size: 写入前的文件大小
+        new_size: 写入后的文件大小
+        block_size: 块大小(字节)
+        
+    Returns:
+        块索引集合
+    """
+    touched = set()
+    for start_pos, length in extents:
+        if length:
+            touched.update(range(start_pos // block_size, (start_pos + length - 1) // block_size + 1))
+    
+    # 文件被扩展时，原末尾的不完整块和新增的零填充块同样发生了变化；
+    # 文件被截断时，新末尾所在的块和被删除的块发生了变化
+    if new_size != old_size:
+        low, high = sorted((old_size, new_size))
+        touched.update(range(low // block_size, (high - 1) // block_size + 1))
+    
+    return touched
+
+
+def cache_file_metadata(file_path: str, metadata: Dict) -> None:
+    """
+    写入元数据缓存，超过上限时淘汰最久未使用的条目
+    
+    Args:
+        file_path: 文件路径
+        metadata: 文件元数据
+    """
+    global metadata_cache_dirty
+    
+    file_metadata_cache[file_path] = metadata
+    file_metadata_cache.move_to_end(file_path)
+    metadata_cache_dirty = True
+    while len(file_metadata_cache) > METADATA_CACHE_MAX_ENTRIES:
+        file_metadata_cache.popitem(last=False)
+
+
+def get_cached_metadata(file_path: str) -> Optional[Dict]:
+    """
+    获取与磁盘上文件状态一致的缓存元数据
+    
+    Args:
+        file_path: 文件路径
+        
+    Returns:
+        缓存的元数据，如果不存在或已过期则返回None
+    """
+    cached = file_metadata_cache.get(file_path)
+    if not cached:
+        return None
+    
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    
+    if cached["mtime"] != stat.st_mtime or cached["size"] != stat.st_size:
+        return None
+    
+    file_metadata_cache.move_to_end(file_path)
+    return cached
+
+
+async def generate_file_metadata(file_path: str, content: Optional[bytes] = None,
+                                 base_metadata: Optional[Dict] = None,
+                                 changed_blocks: Optional[set] = None) -> Dict:
     """
     生成文件的元数据，包括块哈希值
     
     Args:
         file_path: 文件路径
         content: 可选的文件内容，如果提供则使用内存中内容而非重新读取文件
+        base_metadata: 可选的变更前元数据，与changed_blocks一起提供时只重新计算变更块的哈希
+        changed_blocks: 发生变更的块索引集合
         
     Returns:
         文件元数据字典
     """
-    path_obj = Path(file_path)
-    if not content:
-        if not path_obj.exists() or not path_obj.is_file():
+    path_obj = cached_path(file_path)
+    
+    if content is None:
+        if base_metadata is None:
+            # 文件自上次计算后未变化（mtime和大小一致）时直接返回缓存，只需一次stat
+            cached_metadata = get_cached_metadata(str(path_obj))
+            if cached_metadata:
+                return cached_metadata
+        
+        if not path_obj.is_file():
             raise HTTPException(status_code=404, detail=f"文件不存在或不是常规文件: {file_path}")
         
-        # 读取文件内容
-        async with aiofiles.open(path_obj, 'rb') as f:
-            content = await f.read()
+        if base_metadata is not None and changed_blocks is not None:
+            full_hash, blocks = await asyncio.to_thread(
+                _rehash_changed_blocks, str(path_obj), base_metadata["blocks"], changed_blocks, BLOCK_SIZE
+            )
+        else:
+            # 直接从磁盘流式计算哈希，避免将整个文件读入内存
+            full_hash, blocks = await asyncio.to_thread(_stream_file_hashes, str(path_obj), BLOCK_SIZE)
+    else:
+        # 在线程池中计算，批量同步时多个文件的哈希可以并行进行
+        full_hash, blocks = await asyncio.to_thread(_hash_content_blocks, content, BLOCK_SIZE)
     
     # 获取文件信息
     if path_obj.exists():
@@ -1156,26 +2092,6 @@ async def generate_file_metadata(file_path: str, content: Optional[bytes] = None
         mtime = time.time()
         size = len(content)
     
-    # 计算块哈希值（使用4KB块大小）
-    block_size = 4096
-    blocks = {}
-    full_hasher = hashlib.md5()
-    
-    # 分块处理内容
-    for i in range(0, len(content), block_size):
-        block_data = content[i:i+block_size]
-        block_index = i // block_size
-        
-        # 更新完整哈希
-        full_hasher.update(block_data)
-        
-        # 计算块哈希
-        block_hasher = hashlib.md5()
-        block_hasher.update(block_data)
-        blocks[str(block_index)] = block_hasher.hexdigest()
-    
-    full_hash = full_hasher.hexdigest()
-    
     # 构建元数据
     metadata = {
         "path": str(path_obj),
@@ -1186,11 +2102,120 @@ async def generate_file_metadata(file_path: str, content: Optional[bytes] = None
     }
     
     # 缓存元数据
-    file_metadata_cache[str(path_obj)] = metadata
+    cache_file_metadata(str(path_obj), metadata)
     
     return metadata
 
 
+def _pwrite_blocks(file_path: str, blocks: Iterable[Tuple[int, Any]],
+                   size: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    将数据块按偏移原地写入文件
+    
+    写入位置超过文件末尾时由文件系统以零填充。
+    
+    Args:
+        file_path: 文件路径
+        blocks: (起始偏移, 块内容) 序列，块内容为bytes或memoryview
+        size: 写入后的文件大小，为None时只在写入超过末尾时扩展文件
+        
+    Returns:
+        已写入的 (起始偏移, 长度) 列表
+    """
+    extents = []
+    max_end = 0
+    
+    fd = os.open(file_path, os.O_WRONLY)
+    try:
+        for start_pos, block_data in blocks:
+            block_data = memoryview(block_data)
+            
+            # pwrite按偏移直接写入，每个块一次系统调用，无需seek和用户态缓冲；
+            # 短写时用memoryview切片续写，避免复制
+            written = 0
+            while written < len(block_data):
+                written += os.pwrite(fd, block_data[written:], start_pos + written)
+            
+            extents.append((start_pos, len(block_data)))
+            max_end = max(max_end, start_pos + len(block_data))
+        
+        # 空块同样可能要求扩展文件，最后统一扩展一次；
+        # 给出最终大小时按它截断，去掉本地文件缩短后远程残留的末尾
+        if size is not None:
+            os.ftruncate(fd, size)
+        elif max_end > os.fstat(fd).st_size:
+            os.ftruncate(fd, max_end)
+    finally:
+        os.close(fd)
+    
+    return extents
+
+
+def _decode_block_range(items: List[Tuple[int, str]], block_size: int) -> List[Tuple[int, bytes]]:
+    """解码一段增量块，返回 (起始偏移, 块内容) 列表"""
+    return [(block_index * block_size, b64decode(block_data_b64)) for block_index, block_data_b64 in items]
+
+
+def _write_delta_blocks(file_path: str, encoded_blocks: Dict[int, str], block_size: int,
+                        size: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    逐块解码并原地写入文件
+    
+    块数较少时每次只持有一个解码后的块。块数达到DECODE_PARALLEL_THRESHOLD且
+    pybase64可用时分段并行解码，先完成的分段先写入，解码与写入互相重叠。
+    标准库base64解码时不释放GIL，此时并行没有收益，仍逐块解码。
+    
+    Args:
+        file_path: 文件路径
+        encoded_blocks: 块索引 -> base64编码的块内容
+        block_size: 块大小(字节)
+        size: 写入后的文件大小，为None时只在写入超过末尾时扩展文件
+        
+    Returns:
+        已写入的 (起始偏移, 长度) 列表
+    """
+    if not PYBASE64_AVAILABLE or len(encoded_blocks) < DECODE_PARALLEL_THRESHOLD:
+        return _pwrite_blocks(file_path, (
+            (block_index * block_size, b64decode(block_data_b64))
+            for block_index, block_data_b64 in encoded_blocks.items()
+        ), size)
+    
+    items = list(encoded_blocks.items())
+    futures = [
+        _hash_pool.submit(_decode_block_range, items[start:start + DECODE_BLOCKS_PER_TASK], block_size)
+        for start in range(0, len(items), DECODE_BLOCKS_PER_TASK)
+    ]
+    try:
+        return _pwrite_blocks(file_path, (block for future in futures for block in future.result()), size)
+    finally:
+        # 写入失败时取消尚未开始的解码任务
+        for future in futures:
+            future.cancel()
+
+
+async def _metadata_after_delta(file_path: str, base_metadata: Optional[Dict],
+                                extents: List[Tuple[int, int]], block_size: int) -> Dict:
+    """
+    增量写入后生成文件元数据
+    
+    Args:
+        file_path: 文件路径
+        base_metadata: 写入前仍有效的缓存元数据，没有时为None
+        extents: 已写入的 (起始偏移, 长度) 列表
+        block_size: 块大小(字节)
+        
+    Returns:
+        文件元数据字典
+    """
+    # 补丁前的元数据有效时只重新计算变更块的哈希，否则从磁盘流式计算
+    if base_metadata:
+        new_size = os.stat(file_path).st_size
+        changed_blocks = _touched_block_indices(extents, base_metadata["size"], new_size, block_size)
+        return await generate_file_metadata(file_path, base_metadata=base_metadata,
+                                            changed_blocks=changed_blocks)
+    return await generate_file_metadata(file_path)
+
+
 async def process_delta_content(delta_content: DeltaContent) -> Dict:
     """
     处理增量同步内容
@@ -1203,7 +2228,7 @@ async def process_delta_content(delta_content: DeltaContent) -> Dict:
     """
     # 路径映射
     delta_content.path = map_remote_path(delta_content.path)
-    file_path = Path(delta_content.path)
+    file_path = cached_path(delta_content.path)
     
     # 确保父目录存在
     file_path.parent.mkdir(parents=True, exist_ok=True)
@@ -1213,19 +2238,15 @@ async def process_delta_content(delta_content: DeltaContent) -> Dict:
             # 文件未变更，无需操作
             logger.info(f"文件未变更: {file_path}")
             
-            # 如果存在缓存的元数据，返回
-            if str(file_path) in file_metadata_cache:
-                metadata = file_metadata_cache[str(file_path)]
-            else:
-                # 如果文件存在，生成元数据
-                if file_path.exists():
-                    metadata = await generate_file_metadata(str(file_path))
-                else:
-                    return {
-                        "status": "error",
-                        "path": str(file_path),
-                        "message": "文件不存在且未提供内容"
-                    }
+            if not file_path.exists():
+                return {
+                    "status": "error",
+                    "path": str(file_path),
+                    "message": "文件不存在且未提供内容"
+                }
+            
+            # 缓存仍有效时直接返回，否则从磁盘流式重新计算
+            metadata = await generate_file_metadata(str(file_path))
             
             return {
                 "status": "success",
@@ -1237,12 +2258,8 @@ async def process_delta_content(delta_content: DeltaContent) -> Dict:
         elif delta_content.delta_type == "full":
             # 完整文件传输
             if delta_content.content:
-                # 解码Base64内容
-                content = base64.b64decode(delta_content.content)
-                
-                # 写入文件
-                async with aiofiles.open(file_path, 'wb') as f:
-                    await f.write(content)
+                # 解码Base64内容并写入文件，大文件的解码不再阻塞事件循环
+                content = await asyncio.to_thread(_write_base64_sync, file_path, delta_content.content)
                 
                 # 生成元数据
                 metadata = await generate_file_metadata(str(file_path), content)
@@ -1270,43 +2287,26 @@ async def process_delta_content(delta_content: DeltaContent) -> Dict:
                     "message": "增量传输模式但未提供块数据"
                 }
             
-            # 如果文件不存在，无法应用增量更新
-            if not file_path.exists():
+            # 补丁前的缓存元数据仍有效时，只需重新计算变更块的哈希
+            base_metadata = get_cached_metadata(str(file_path))
+            
+            # 逐块解码并原地写入，不再整文件读入内存；
+            # 文件是否存在由工作线程中的open判断，不在事件循环中额外stat。
+            # 写入后按本地文件大小截断，本地文件缩短时不在远程留下旧的末尾
+            try:
+                extents = await asyncio.to_thread(
+                    _write_delta_blocks, str(file_path), delta_content.blocks, BLOCK_SIZE,
+                    delta_content.size if delta_content.size > 0 else None
+                )
+            except FileNotFoundError:
                 return {
                     "status": "error",
                     "path": str(file_path),
                     "message": "文件不存在，无法应用增量更新"
                 }
             
-            # 读取现有文件
-            async with aiofiles.open(file_path, 'rb') as f:
-                content = await f.read()
-            
-            # 将内容转换为可变字节数组
-            content_array = bytearray(content)
-            block_size = 4096
-            
-            # 应用增量更新
-            for block_index_str, block_data_b64 in delta_content.blocks.items():
-                block_index = int(block_index_str)
-                block_data = base64.b64decode(block_data_b64)
-                
-                start_pos = block_index * block_size
-                end_pos = start_pos + len(block_data)
-                
-                # 确保数组大小足够
-                if end_pos > len(content_array):
-                    content_array.extend(b'\0' * (end_pos - len(content_array)))
-                
-                # 更新块
-                content_array[start_pos:end_pos] = block_data
-            
-            # 写入更新后的文件
-            async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(content_array)
-            
-            # 生成元数据
-            metadata = await generate_file_metadata(str(file_path), bytes(content_array))
+            # 生成元数据（从磁盘流式计算，不复制整个文件内容）
+            metadata = await _metadata_after_delta(str(file_path), base_metadata, extents, BLOCK_SIZE)
             
             logger.info(f"文件增量更新: {file_path}")
             return {
@@ -1332,34 +2332,186 @@ async def process_delta_content(delta_content: DeltaContent) -> Dict:
         }
 
 
+async def process_raw_delta(path: str, body: bytes, block_indices: List[int], block_lengths: List[int]) -> Dict:
+    """
+    应用未经Base64编码的增量数据块
+    
+    请求体为按顺序拼接的块内容，各块直接以memoryview切片写入文件，不做额外复制。
+    
+    Args:
+        path: 文件路径
+        body: 拼接后的块内容
+        block_indices: 块索引列表
+        block_lengths: 与block_indices一一对应的块长度列表
+        
+    Returns:
+        处理结果字典
+    """
+    file_path = cached_path(map_remote_path(path))
+    
+    try:
+        base_metadata = get_cached_metadata(str(file_path))
+        
+        view = memoryview(body)
+        blocks = []
+        offset = 0
+        for block_index, length in zip(block_indices, block_lengths):
+            blocks.append((block_index * BLOCK_SIZE, view[offset:offset + length]))
+            offset += length
+        
+        try:
+            extents = await asyncio.to_thread(_pwrite_blocks, str(file_path), blocks)
+        except FileNotFoundError:
+            return {
+                "status": "error",
+                "path": str(file_path),
+                "message": "文件不存在，无法应用增量更新"
+            }
+        metadata = await _metadata_after_delta(str(file_path), base_metadata, extents, BLOCK_SIZE)
+        
+        logger.info(f"文件增量更新: {file_path}")
+        return {
+            "status": "success",
+            "path": str(file_path),
+            "message": "文件已增量更新",
+            "metadata": metadata
+        }
+    except Exception as e:
+        logger.error(f"处理增量内容失败: {str(e)}")
+        return {
+            "status": "error",
+            "path": str(file_path),
+            "message": f"处理失败: {str(e)}"
+        }
+
+
+def _parse_int_list(value: str, name: str) -> List[int]:
+    """
+    解析逗号分隔的非负整数列表
+    
+    Args:
+        value: 请求头的值
+        name: 请求头名称，用于错误信息
+        
+    Returns:
+        整数列表
+    """
+    try:
+        numbers = [int(item) for item in value.split(",")] if value.strip() else []
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"请求头格式错误: {name}")
+    
+    if any(number < 0 for number in numbers):
+        raise HTTPException(status_code=400, detail=f"请求头包含负数: {name}")
+    
+    return numbers
+
+
+def _fsync_directories(directories: set) -> None:
+    """
+    对目录执行fsync，持久化其中新建或替换的目录项
+    
+    Args:
+        directories: 目录路径集合
+    """
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    
+    for directory in directories:
+        try:
+            fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.warning(f"目录fsync失败: {directory} - {str(e)}")
+
+
+async def _gather_bounded(func, items: List[Any], limit: int = SYNC_CONCURRENCY) -> List[Any]:
+    """
+    以有限并发对每个元素执行异步函数
+    
+    Args:
+        func: 接收单个元素的异步函数
+        items: 元素列表
+        limit: 最大并发数，避免大批量同步时耗尽文件描述符
+        
+    Returns:
+        与items一一对应的结果，异常以对象形式返回
+    """
+    semaphore = asyncio.Semaphore(limit)
+    
+    async def run_one(item):
+        async with semaphore:
+            return await func(item)
+    
+    return await asyncio.gather(*(run_one(item) for item in items), return_exceptions=True)
+
+
+async def _apply_deltas_batch(files: List[DeltaContent]) -> List[Union[Dict, BaseException]]:
+    """
+    并发应用一批增量同步内容
+    
+    各文件的写入和哈希在线程池中并行执行，全部完成后
+    按父目录统一fsync一次，而不是每个文件单独处理。
+    
+    Args:
+        files: 增量内容列表
+        
+    Returns:
+        与files一一对应的处理结果，异常以对象形式返回
+    """
+    results = await _gather_bounded(process_delta_content, files)
+    
+    # process_delta_content会将路径映射后写回delta_content.path
+    parent_dirs = {
+        str(cached_path(delta_content.path).parent)
+        for delta_content, result in zip(files, results)
+        if isinstance(result, dict) and result.get("status") == "success"
+    }
+    if parent_dirs:
+        await asyncio.to_thread(_fsync_directories, parent_dirs)
+    
+    return results
+
+
 # API端点
 @app.get("/")
-def read_root():
+async def read_root():
     """根路由，返回服务器信息"""
     return {
         "name": "Sync-HTTP-MCP Remote Server",
         "version": "0.2.0",
         "delta_sync_supported": True,
+        "hash_algorithm": SERVER_CONFIG["hash_algorithm"],
+        "checksum_algorithms": list(CHECKSUM_ALGORITHMS),
+        "raw_upload_supported": True,
+        "metadata_query_supported": True,
+        "msgpack_sync_supported": MSGPACK_AVAILABLE,
         "git_sync_supported": GIT_AVAILABLE
     }
 
 
 @app.get("/api/v1/files")
-def list_files(path: str):
+async def list_files(path: str):
     """列出目录内容"""
     # 路径映射
     path = map_remote_path(path)
     
-    dir_path = Path(path)
-    if not dir_path.exists():
+    # 一次stat同时完成存在性和类型检查
+    try:
+        dir_stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
         raise HTTPException(status_code=404, detail=f"目录不存在: {path}")
     
-    if not dir_path.is_dir():
+    if not S_ISDIR(dir_stat.st_mode):
         raise HTTPException(status_code=400, detail=f"路径不是目录: {path}")
     
-    files = []
-    for item in dir_path.iterdir():
-        files.append(get_file_info(str(item)))
+    dir_path = cached_path(path)
+    
+    # 大目录的遍历在线程池中进行，避免阻塞事件循环
+    files = await asyncio.to_thread(_list_dir_sync, str(dir_path))
     
     return {"files": files}
 
@@ -1375,12 +2527,9 @@ async def update_file_content(file_content: FileContent):
     """更新文件内容"""
     result = await write_file_content(file_content)
     
-    # 广播文件变更事件
-    await manager.broadcast({
-        "type": "file_changed",
-        "path": file_content.path,
-        "action": "updated"
-    })
+    # 广播文件变更事件（内容未变化时无需通知）
+    if not result.get("skipped"):
+        await broadcast_file_changed(file_content.path)
     
     return result
 
@@ -1391,52 +2540,165 @@ async def update_file_delta(delta_content: DeltaContent):
     result = await process_delta_content(delta_content)
     
     # 广播文件变更事件
-    await manager.broadcast({
-        "type": "file_changed",
-        "path": delta_content.path,
-        "action": "updated"
-    })
+    await broadcast_file_changed(delta_content.path)
     
     return result
 
 
-@app.post("/api/v1/files/sync")
-async def sync_files(file_sync: FileSyncRequest):
-    """批量同步文件"""
+@app.put("/api/v1/files/content_raw")
+async def update_file_content_raw(request: Request, path: str, checksum: Optional[str] = None,
+                                  checksum_algorithm: str = "md5"):
+    """更新文件内容（请求体为原始文件内容，无需Base64编解码）"""
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        try:
+            content_length = int(content_length)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"无效的Content-Length: {content_length}")
+    if content_length is None or content_length > STREAM_UPLOAD_THRESHOLD:
+        result = await write_raw_file_stream(path, request.stream(), checksum, checksum_algorithm)
+    else:
+        content = await request.body()
+        result = await write_raw_file_content(path, content, checksum, checksum_algorithm)
+    
+    # 广播文件变更事件（内容未变化时无需通知）
+    if not result.get("skipped"):
+        await broadcast_file_changed(result["path"])
+    
+    return result
+
+
+@app.put("/api/v1/files/delta_raw")
+async def update_file_delta_raw(request: Request, path: str,
+                                x_block_indices: str = Header(...),
+                                x_block_lengths: str = Header(...)):
+    """
+    更新文件内容（增量，请求体为按顺序拼接的原始块内容）
+    
+    块索引和长度分别通过X-Block-Indices和X-Block-Lengths请求头以逗号分隔传递。
+    """
+    block_indices = _parse_int_list(x_block_indices, "X-Block-Indices")
+    block_lengths = _parse_int_list(x_block_lengths, "X-Block-Lengths")
+    if not block_indices:
+        raise HTTPException(status_code=400, detail="增量传输模式但未提供块数据")
+    if len(block_indices) != len(block_lengths):
+        raise HTTPException(status_code=400, detail="块索引与块长度的数量不一致")
+    
+    body = await request.body()
+    if sum(block_lengths) != len(body):
+        raise HTTPException(
+            status_code=400,
+            detail=f"请求体长度与块长度之和不一致: {len(body)} != {sum(block_lengths)}"
+        )
+    
+    result = await process_raw_delta(path, body, block_indices, block_lengths)
+    
+    # 广播文件变更事件
+    if result["status"] == "success":
+        await broadcast_file_changed(result["path"])
+    
+    return result
+
+
+def _sync_response(paths: List[str], batch_results: List[Any]) -> Tuple[dict, List[Dict]]:
+    """
+    汇总批量同步的写入结果
+    
+    Args:
+        paths: 各文件的路径，顺序与batch_results一致
+        batch_results: 各文件的写入结果或异常
+        
+    Returns:
+        (响应字典, 内容发生变化的文件列表)
+    """
     results = []
     synchronized = 0
     failed = 0
+    changed_files = []
     
-    for file_content in file_sync.files:
-        try:
-            result = await write_file_content(file_content)
+    for path, result in zip(paths, batch_results):
+        if isinstance(result, BaseException):
             results.append({
-                "path": file_content.path,
-                "status": "success"
-            })
-            synchronized += 1
-            
-            # 广播文件变更事件
-            await manager.broadcast({
-                "type": "file_changed",
-                "path": file_content.path,
-                "action": "updated"
-            })
-            
-        except Exception as e:
-            results.append({
-                "path": file_content.path,
+                "path": path,
                 "status": "error",
-                "message": str(e)
+                "message": str(result)
             })
             failed += 1
+            continue
+        
+        # 返回写入后的完整哈希，客户端据此在下次同步前确认远程文件未被改动
+        results.append({
+            "path": path,
+            "status": "success",
+            "full_hash": result["metadata"]["full_hash"]
+        })
+        synchronized += 1
+        if not result.get("skipped"):
+            changed_files.append({"path": path})
     
     return {
         "status": "success",
         "synchronized": synchronized,
         "failed": failed,
         "details": results
-    }
+    }, changed_files
+
+
+@app.post("/api/v1/files/sync")
+async def sync_files(file_sync: FileSyncRequest):
+    """批量同步文件"""
+    # 并发写入，结果顺序与请求中的文件顺序一致
+    batch_results = await _gather_bounded(write_file_content, file_sync.files)
+    response, changed_files = _sync_response([f.path for f in file_sync.files], batch_results)
+    
+    # 广播文件变更事件
+    if changed_files:
+        await broadcast_files_changed(changed_files)
+    
+    return response
+
+
+def _unpack_sync_files(body: bytes) -> List[Dict]:
+    """解析msgpack格式的批量同步请求体并检查各文件项的字段类型"""
+    try:
+        payload = msgpack.unpackb(body, raw=False)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"无法解析msgpack请求体: {str(e)}")
+    
+    files = payload.get("files") if isinstance(payload, dict) else None
+    if not isinstance(files, list):
+        raise HTTPException(status_code=400, detail="请求体缺少files列表")
+    for item in files:
+        if not (isinstance(item, dict) and isinstance(item.get("path"), str)
+                and isinstance(item.get("content"), bytes)):
+            raise HTTPException(status_code=400, detail="文件项必须包含字符串path和二进制content")
+    return files
+
+
+@app.post("/api/v1/files/sync_msgpack")
+async def sync_files_msgpack(request: Request):
+    """
+    批量同步文件（msgpack请求体，文件内容为原始字节）
+    
+    请求体格式与/api/v1/files/sync相同，但content直接携带二进制数据，省去Base64编解码。
+    """
+    if not MSGPACK_AVAILABLE:
+        raise HTTPException(status_code=415, detail="服务器未安装msgpack")
+    
+    files = _unpack_sync_files(await request.body())
+    
+    async def write_item(item: Dict) -> dict:
+        return await write_raw_file_content(item["path"], item["content"], item.get("checksum"),
+                                            item.get("checksum_algorithm") or "md5")
+    
+    batch_results = await _gather_bounded(write_item, files)
+    response, changed_files = _sync_response([map_remote_path(item["path"]) for item in files], batch_results)
+    
+    # 广播文件变更事件
+    if changed_files:
+        await broadcast_files_changed(changed_files)
+    
+    return response
 
 
 @app.post("/api/v1/files/delta_sync")
@@ -1446,10 +2708,15 @@ async def delta_sync_files(delta_sync: DeltaSyncRequest):
     synchronized = 0
     failed = 0
     metadata_dict = {}
+    changed_files = []
+    
+    batch_results = await _apply_deltas_batch(delta_sync.files)
     
-    for delta_content in delta_sync.files:
+    for delta_content, result in zip(delta_sync.files, batch_results):
         try:
-            result = await process_delta_content(delta_content)
+            if isinstance(result, BaseException):
+                raise result
+            
             if result["status"] == "success":
                 results.append({
                     "path": delta_content.path,
@@ -1461,11 +2728,8 @@ async def delta_sync_files(delta_sync: DeltaSyncRequest):
                 if "metadata" in result:
                     metadata_dict[delta_content.path] = result["metadata"]
                 
-                # 广播文件变更事件
-                await manager.broadcast({
-                    "type": "file_changed",
+                changed_files.append({
                     "path": delta_content.path,
-                    "action": "updated",
                     "delta_type": delta_content.delta_type
                 })
             else:
@@ -1484,6 +2748,10 @@ async def delta_sync_files(delta_sync: DeltaSyncRequest):
             })
             failed += 1
     
+    # 广播文件变更事件
+    if changed_files:
+        await broadcast_files_changed(changed_files)
+    
     return {
         "status": "success",
         "synchronized": synchronized,
@@ -1493,45 +2761,85 @@ async def delta_sync_files(delta_sync: DeltaSyncRequest):
     }
 
 
+@app.post("/api/v1/files/metadata")
+async def query_files_metadata(query: MetadataQueryRequest):
+    """
+    批量查询文件的大小和完整哈希
+    
+    客户端跳过本地未变化的文件前，用它确认远程文件仍是上次同步的内容。
+    文件自上次计算后未变化时直接返回缓存的元数据，只需一次stat。
+    结果顺序与请求中的路径顺序一致，不存在或无法读取的文件exists为False。
+    """
+    paths = [map_remote_path(path) for path in query.paths]
+    batch_results = await _gather_bounded(generate_file_metadata, paths)
+    
+    files = []
+    for path, result in zip(paths, batch_results):
+        if isinstance(result, BaseException):
+            files.append({"path": path, "exists": False})
+        else:
+            files.append({
+                "path": path,
+                "exists": True,
+                "size": result["size"],
+                "full_hash": result["full_hash"]
+            })
+    
+    return {"hash_algorithm": SERVER_CONFIG["hash_algorithm"], "files": files}
+
+
 @app.post("/api/v1/commands")
 async def execute_command_api(command_request: CommandRequest):
     """执行命令API"""
     command_id = await execute_command(command_request)
+    command_info = active_commands[command_id]
     return {
         "command_id": command_id,
-        "status": active_commands[command_id]["status"],
-        "start_time": active_commands[command_id]["start_time"]
+        "status": command_info["status"],
+        "start_time": command_info["start_time"]
     }
 
 
 @app.get("/api/v1/commands/{command_id}")
-def get_command_status(command_id: str):
+async def get_command_status(command_id: str):
     """获取命令状态"""
-    if command_id not in active_commands:
+    command_info = active_commands.get(command_id)
+    if command_info is None:
         raise HTTPException(status_code=404, detail=f"未找到命令: {command_id}")
     
-    command_info = active_commands[command_id]
-    return {
+    # 轮询频繁且只含基本类型，直接返回响应对象以跳过jsonable_encoder
+    return ORJSONResponse({
         "command_id": command_id,
         "status": command_info["status"],
         "start_time": command_info["start_time"],
         "end_time": command_info["end_time"],
         "exit_code": command_info["exit_code"],
         "output_url": f"/api/v1/commands/{command_id}/output"
-    }
+    })
 
 
 @app.get("/api/v1/commands/{command_id}/output")
-def get_command_output(command_id: str):
-    """获取命令输出"""
-    if command_id not in active_commands:
+async def get_command_output(command_id: str, offset: int = 0):
+    """
+    获取命令输出
+    
+    Args:
+        command_id: 命令ID
+        offset: 只返回该位置(字符)之后的输出，轮询时传入已收到的长度即可增量获取
+    """
+    command_info = active_commands.get(command_id)
+    if command_info is None:
         raise HTTPException(status_code=404, detail=f"未找到命令: {command_id}")
     
-    command_info = active_commands[command_id]
-    return {
-        "output": command_info["output"],
+    offset = max(offset, 0)
+    output, length = get_command_output_text(command_info, offset)
+    # 输出可能很长，直接交给orjson序列化，不再经过jsonable_encoder逐字段处理
+    return ORJSONResponse({
+        "output": output,
+        "offset": offset,
+        "length": length,
         "is_complete": command_info["status"] in ["completed", "failed", "timeout"]
-    }
+    })
 
 
 @app.websocket("/ws")
@@ -1540,15 +2848,26 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            # 等待客户端消息
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            # 等待客户端消息，文本帧和二进制帧都接受
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            # 无法解析的消息忽略，不影响连接上的推送
+            try:
+                data = orjson.loads(message.get("text") or message.get("bytes") or b"")
+            except orjson.JSONDecodeError:
+                logger.debug("忽略无法解析的WebSocket消息")
+                continue
             
             # 处理消息
-            if message.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
+            if isinstance(data, dict) and data.get("type") == "ping":
+                await websocket.send_bytes(PONG_MESSAGE)
             
     except WebSocketDisconnect:
+        pass
+    finally:
+        # 无论以何种方式退出都移除连接，停止其发送任务并释放队列
         manager.disconnect(websocket)
 
 
@@ -1559,6 +2878,15 @@ async def startup_event():
     if SERVER_CONFIG["git_cache_enabled"] and GIT_STATE_AVAILABLE:
         await load_git_state_cache()
     
+    # 加载上次运行保存的文件元数据缓存
+    await asyncio.to_thread(load_metadata_cache)
+    
+    # 启动过期命令清理任务
+    app.state.command_cleanup_task = asyncio.create_task(cleanup_finished_commands())
+    
+    # 启动元数据缓存定期保存任务
+    app.state.metadata_save_task = asyncio.create_task(persist_metadata_cache())
+    
     # 创建测试模式目录结构
     if SERVER_CONFIG["test_mode"]:
         os.makedirs(SERVER_CONFIG["test_root_dir"], exist_ok=True)
@@ -1573,6 +2901,19 @@ async def shutdown_event():
     # 保存Git状态缓存
     if SERVER_CONFIG["git_cache_enabled"] and GIT_STATE_AVAILABLE:
         await save_git_state_cache()
+    
+    # 停止过期命令清理任务
+    cleanup_task = getattr(app.state, "command_cleanup_task", None)
+    if cleanup_task:
+        cleanup_task.cancel()
+    
+    # 停止元数据缓存定期保存任务
+    save_task = getattr(app.state, "metadata_save_task", None)
+    if save_task:
+        save_task.cancel()
+    
+    # 保存文件元数据缓存
+    await asyncio.to_thread(save_metadata_cache, dict(file_metadata_cache))
 
 
 async def load_git_state_cache():
@@ -1619,8 +2960,8 @@ async def save_git_state_cache():
     if not GIT_STATE_AVAILABLE:
         return
     
-    # 保存所有状态管理器的缓存
-    for path, manager in GIT_STATE_MANAGERS.items():
+    # 保存所有状态管理器的缓存（遍历快照，避免并发创建管理器时字典在迭代中改变）
+    for path, manager in list(GIT_STATE_MANAGERS.items()):
         try:
             if manager.save_cache():
                 logger.info(f"已保存Git状态缓存: {path}")
@@ -1630,6 +2971,67 @@ async def save_git_state_cache():
             logger.error(f"保存Git状态缓存异常: {path} - {str(e)}")
 
 
+def load_metadata_cache():
+    """
+    从CACHE_FILE加载文件元数据缓存
+    
+    条目在使用时由get_cached_metadata按mtime和大小校验，过期条目不会被使用。
+    """
+    if not CACHE_FILE.exists():
+        return
+    
+    try:
+        cache_data = orjson.loads(CACHE_FILE.read_bytes())
+        
+        # 哈希算法变更后旧缓存无效
+        if cache_data.get("hash_algorithm") != SERVER_CONFIG["hash_algorithm"]:
+            logger.info("元数据缓存的哈希算法与当前配置不一致，忽略缓存")
+            return
+        
+        for file_path, metadata in cache_data.get("files", {}).items():
+            cache_file_metadata(file_path, metadata)
+        logger.info(f"已加载文件元数据缓存: {len(file_metadata_cache)}个文件")
+    except Exception as e:
+        logger.error(f"加载文件元数据缓存失败: {CACHE_FILE} - {str(e)}")
+
+
+def save_metadata_cache(files: Dict[str, Dict]):
+    """
+    将文件元数据缓存保存到CACHE_FILE
+    
+    先写入临时文件再原子替换，进程在写入过程中被终止也不会留下损坏的缓存文件。
+    
+    Args:
+        files: 元数据缓存的快照，需在事件循环中复制后传入
+    """
+    tmp_file = CACHE_FILE.with_suffix(".tmp")
+    try:
+        cache_data = {
+            "hash_algorithm": SERVER_CONFIG["hash_algorithm"],
+            "files": files
+        }
+        tmp_file.write_bytes(orjson.dumps(cache_data))
+        os.replace(tmp_file, CACHE_FILE)
+        logger.info(f"已保存文件元数据缓存: {len(files)}个文件")
+    except Exception as e:
+        logger.error(f"保存文件元数据缓存失败: {CACHE_FILE} - {str(e)}")
+
+
+async def persist_metadata_cache():
+    """定期保存有变更的元数据缓存，进程异常退出时最多丢失一个周期内的更新"""
+    global metadata_cache_dirty
+    
+    while True:
+        await asyncio.sleep(METADATA_CACHE_SAVE_INTERVAL)
+        
+        if not metadata_cache_dirty:
+            continue
+        
+        # 在事件循环中复制快照，保存期间的新变更留到下一周期
+        metadata_cache_dirty = False
+        await asyncio.to_thread(save_metadata_cache, dict(file_metadata_cache))
+
+
 def get_or_create_state_manager(path: str) -> Optional[GitStateManager]:
     """获取或创建Git状态管理器"""
     if not GIT_STATE_AVAILABLE:
@@ -1676,6 +3078,8 @@ if __name__ == "__main__":
     parser.add_argument("--test-root", help="测试模式根目录 (默认: ~/mcp_test_root)")
     parser.add_argument("--cache-dir", help="Git状态缓存目录 (默认: ~/.mcp_cache)")
     parser.add_argument("--disable-git-cache", action="store_true", help="禁用Git状态缓存")
+    parser.add_argument("--hash-algorithm", default="md5", choices=HASH_ALGORITHMS,
+                      help="文件元数据哈希算法，需与客户端一致；sha256在支持SHA扩展指令的CPU上更快 (默认: md5)")
     
     args = parser.parse_args()
     
@@ -1698,5 +3102,7 @@ if __name__ == "__main__":
         SERVER_CONFIG["git_cache_enabled"] = False
         logger.info("已禁用Git状态缓存")
     
+    SERVER_CONFIG["hash_algorithm"] = args.hash_algorithm
+    
     # 启动服务器
     uvicorn.run(app, host=args.host, port=args.port)
\ No newline at end of file
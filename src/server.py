@@ -8,9 +8,11 @@ Sync-HTTP-MCP Server
 设置路由和启动服务器。
 """
 
+import asyncio
+import json
 import logging
 import os
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 
 import uvicorn
 from fastapi import Depends, FastAPI, HTTPException, WebSocket, WebSocketDisconnect
@@ -90,31 +92,39 @@ builds = {}    # build_id -> build_data
 class ConnectionManager:
     """管理WebSocket连接"""
     def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
 
     async def connect(self, websocket: WebSocket, session_id: str):
         """处理新的WebSocket连接"""
         await websocket.accept()
-        if session_id not in self.active_connections:
-            self.active_connections[session_id] = []
-        self.active_connections[session_id].append(websocket)
+        self.active_connections.setdefault(session_id, set()).add(websocket)
         logger.info(f"WebSocket连接已建立, session_id={session_id}")
 
     def disconnect(self, websocket: WebSocket, session_id: str):
         """处理WebSocket断开连接"""
         if session_id in self.active_connections:
-            if websocket in self.active_connections[session_id]:
-                self.active_connections[session_id].remove(websocket)
+            self.active_connections[session_id].discard(websocket)
             if not self.active_connections[session_id]:
                 del self.active_connections[session_id]
         logger.info(f"WebSocket连接已断开, session_id={session_id}")
 
     async def broadcast(self, message: dict, session_id: str):
         """向指定会话的所有连接广播消息"""
-        if session_id in self.active_connections:
-            for connection in self.active_connections[session_id]:
-                await connection.send_json(message)
-            logger.debug(f"消息已广播到session_id={session_id}: {message}")
+        connections = list(self.active_connections.get(session_id, ()))
+        if not connections:
+            return
+        
+        # 只序列化一次，并发发送，单个慢连接不会阻塞其他连接
+        payload = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+        results = await asyncio.gather(
+            *(connection.send_text(payload) for connection in connections),
+            return_exceptions=True
+        )
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.warning(f"WebSocket发送失败，移除连接: {str(result)}")
+                self.disconnect(connection, session_id)
+        logger.debug(f"消息已广播到session_id={session_id}: {message}")
 
 
 manager = ConnectionManager()
@@ -8,17 +8,63 @@ Sync-HTTP-MCP 简化客户端库
 """
 
 import base64
-import hashlib
 import json
+import hashlib
 import logging
+import mmap
 import os
+import queue
 import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any, Tuple, Iterator
 
 import requests
 import websocket
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 尝试导入orjson（更快的JSON序列化），不可用时使用标准库json
+try:
+    import orjson
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+    ORJSON_AVAILABLE = True
+except ImportError:
+    def json_dumps(obj) -> bytes:
+        """序列化为紧凑的UTF-8 JSON字节串，与orjson.dumps的输出格式一致"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    json_loads = json.loads
+    ORJSON_AVAILABLE = False
+
+# 尝试导入pybase64（基于SIMD的Base64实现），不可用时使用标准库
+try:
+    import pybase64
+    b64encode = pybase64.b64encode
+    b64decode = pybase64.b64decode
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    b64encode = base64.b64encode
+    b64decode = base64.b64decode
+    PYBASE64_AVAILABLE = False
+
+# 尝试导入blake3（基于SIMD的哈希实现），服务器同样支持时用作上传校验和算法
+try:
+    from blake3 import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+# 尝试导入msgpack，服务器同样支持时批量同步直接发送原始字节，省去Base64编码
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
 
 # 配置日志
 logging.basicConfig(
@@ -27,6 +73,246 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 编码与哈希的分段大小，须为3的倍数，保证各段的Base64编码可以直接拼接
+ENCODE_CHUNK_SIZE = 3 * 256 * 1024
+
+
+def encode_and_hash(content: bytes, checksum_algorithm: str = "md5") -> Tuple[str, str]:
+    """
+    一次遍历同时完成Base64编码和校验和计算
+    
+    按段交替编码和哈希，每段数据在缓存中仍是热的，避免对整个内容做两遍独立的遍历。
+    
+    Args:
+        content: 文件内容字节数据
+        checksum_algorithm: 校验和算法，"md5"或"blake3"
+        
+    Returns:
+        (Base64编码后的字符串, 校验和)
+    """
+    hasher = blake3() if checksum_algorithm == "blake3" else hashlib.md5()
+    view = memoryview(content)
+    parts = []
+    for start in range(0, len(view), ENCODE_CHUNK_SIZE):
+        chunk = view[start:start + ENCODE_CHUNK_SIZE]
+        hasher.update(chunk)
+        parts.append(b64encode(chunk))
+    return b"".join(parts).decode('ascii'), hasher.hexdigest()
+
+
+# 不超过该大小的文件按内容缓存编码结果：仓库中相同的小文件（空的__init__.py、
+# 许可证头等）很多，同一会话中只需编码和哈希一次
+ENCODE_CACHE_MAX_CONTENT = 16 * 1024
+ENCODE_CACHE_MAX_ENTRIES = 1024
+
+
+@lru_cache(maxsize=ENCODE_CACHE_MAX_ENTRIES)
+def encode_and_hash_cached(content: bytes, checksum_algorithm: str = "md5") -> Tuple[str, str]:
+    """按内容缓存的encode_and_hash，以完整内容作为键，不存在哈希碰撞的问题"""
+    return encode_and_hash(content, checksum_algorithm)
+
+
+# 批量同步的文件数达到该值时，编码和哈希交给线程池并行进行
+PREPARE_PARALLEL_MIN_FILES = 4
+
+# 同步目录时每批读取并上传的文件数，限制同时映射的文件数量
+SYNC_BATCH_FILES = 64
+
+# 批量同步拆分为多个请求，每个请求的文件数和Base64内容总大小上限
+SYNC_REQUEST_MAX_FILES = 32
+SYNC_REQUEST_MAX_BYTES = 8 * 1024 * 1024
+SYNC_HTTP_WORKERS = 8  # 并发发送同步请求的线程数
+HTTP_POOL_SIZE = 16  # 每个主机保持的HTTP连接数，不小于SYNC_HTTP_WORKERS
+HTTP_MAX_RETRIES = 3  # 连接失败等可安全重试的错误的最大重试次数
+
+# 目录列表缓存的有效期(秒)和最大条目数，本客户端修改文件时相关目录的缓存立即失效
+LIST_CACHE_TTL = 5.0
+LIST_CACHE_MAX_ENTRIES = 256
+# 已结束命令的状态不会再变化，缓存后不再请求服务器
+FINISHED_COMMAND_CACHE_MAX_ENTRIES = 256
+FINISHED_COMMAND_STATUSES = ("completed", "failed", "timeout")
+
+# 记录已同步文件状态的缓存目录，每个服务器一个缓存文件，不写入工作区；
+# 本地文件的mtime和大小未变、且服务器确认远程文件仍是上次上传的内容时跳过上传
+SYNC_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "sync-http-mcp"
+# 向服务器确认跳过的文件时，每个请求查询的文件数
+SYNC_CONFIRM_BATCH_FILES = 512
+
+# 请求体由json_dumps序列化后直接发送，不经过requests内部的json序列化
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def sync_cache_file(server_url: str) -> Path:
+    """
+    返回服务器对应的同步缓存文件路径
+    
+    Args:
+        server_url: 服务器URL
+        
+    Returns:
+        缓存文件路径
+    """
+    digest = hashlib.sha1(server_url.encode("utf-8")).hexdigest()[:16]
+    return SYNC_CACHE_DIR / f"sync-{digest}.json"
+
+
+def map_file_content(file_path: Union[str, Path]) -> Union[bytes, mmap.mmap]:
+    """
+    以只读方式映射文件内容
+    
+    映射后的内容由操作系统页缓存持有，编码和哈希直接读取映射，不再复制到进程堆中。
+    
+    Args:
+        file_path: 文件路径
+        
+    Returns:
+        只读的mmap对象，空文件无法映射，返回b""
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_local_files(root: str) -> Iterator[os.DirEntry]:
+    """
+    递归遍历目录下的文件
+    
+    与os.walk遍历的范围相同（不进入指向目录的符号链接），但直接返回DirEntry，
+    调用方可以复用scandir时已获得的类型信息和stat结果。
+    
+    Args:
+        root: 目录路径
+        
+    Returns:
+        文件的DirEntry迭代器
+    """
+    pending_dirs = [root]
+    while pending_dirs:
+        try:
+            with os.scandir(pending_dirs.pop()) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        yield entry
+                    elif not entry.is_symlink():
+                        pending_dirs.append(entry.path)
+        except OSError as e:
+            logger.error(f"读取目录错误: {str(e)}")
+
+
+def release_file_content(content: Union[bytes, mmap.mmap]) -> None:
+    """释放map_file_content返回的映射"""
+    if isinstance(content, mmap.mmap):
+        content.close()
+
+
+def content_checksum(content, checksum_algorithm: str = "md5") -> str:
+    """
+    计算上传内容的校验和
+    
+    Args:
+        content: 文件内容（字节数据或mmap）
+        checksum_algorithm: 校验和算法，md5或blake3
+        
+    Returns:
+        十六进制校验和
+    """
+    hasher = blake3() if checksum_algorithm == "blake3" else hashlib.md5()
+    hasher.update(content)
+    return hasher.hexdigest()
+
+
+def prepare_sync_file(file_info: Dict, checksum_algorithm: str = "md5", binary: bool = False) -> Dict:
+    """
+    将文件变更转换为批量同步请求中的一项
+    
+    Args:
+        file_info: 文件变更，包含path和content（字节数据、mmap或已编码的Base64字符串）
+        checksum_algorithm: 校验和算法
+        binary: 为True时保留原始内容用于msgpack请求，不做Base64编码
+        
+    Returns:
+        同步请求中的文件项
+    """
+    content = file_info.get("content", b"")
+    if binary:
+        if isinstance(content, str):
+            content = b64decode(content)
+        return {
+            "path": file_info["path"],
+            "content": content,
+            "checksum": content_checksum(content, checksum_algorithm),
+            "checksum_algorithm": checksum_algorithm
+        }
+    
+    if isinstance(content, str):
+        encoded_content = content
+        checksum = None
+    elif len(content) <= ENCODE_CACHE_MAX_CONTENT:
+        encoded_content, checksum = encode_and_hash_cached(bytes(content), checksum_algorithm)
+    else:
+        encoded_content, checksum = encode_and_hash(content, checksum_algorithm)
+    
+    return {
+        "path": file_info["path"],
+        "content": encoded_content,
+        "checksum": checksum,
+        "checksum_algorithm": checksum_algorithm
+    }
+
+
+def _msgpack_default(obj):
+    """msgpack无法直接打包mmap，以memoryview形式按二进制打包，不复制文件内容"""
+    if isinstance(obj, mmap.mmap):
+        return memoryview(obj)
+    raise TypeError(f"无法序列化类型: {type(obj)}")
+
+
+class TTLCache:
+    """带过期时间的LRU缓存，可在多个线程中使用"""
+    
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        """
+        Args:
+            maxsize: 最多保留的条目数，超过时淘汰最久未使用的条目
+            ttl: 条目有效期(秒)，为None时不过期
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (写入时间, value)
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        """获取未过期的缓存值，不存在或已过期时返回None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+    
+    def set(self, key, value):
+        """写入缓存"""
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+    
+    def invalidate_ancestors(self, path: str):
+        """使path所在目录及其所有上级目录的缓存失效"""
+        with self.lock:
+            for key in list(self.entries):
+                if path.startswith(key.rstrip("/") + "/"):
+                    del self.entries[key]
+
 
 class SimplifiedMCPClient:
     """简化版MCP客户端主类，处理与远程服务器的所有通信"""
@@ -40,9 +326,37 @@ class SimplifiedMCPClient:
             workspace_path: 本地工作区路径
         """
         self.server_url = server_url.rstrip("/")
+        # 各接口地址只在初始化时拼接一次，轮询和批量同步时直接复用
+        api_url = f"{self.server_url}/api/v1"
+        self.files_url = f"{api_url}/files"
+        self.file_content_url = f"{api_url}/files/content"
+        self.file_content_raw_url = f"{api_url}/files/content_raw"
+        self.sync_url = f"{api_url}/files/sync"
+        self.sync_msgpack_url = f"{api_url}/files/sync_msgpack"
+        self.metadata_url = f"{api_url}/files/metadata"
+        self.commands_url = f"{api_url}/commands"
+        self.ws_url = f"{self.server_url.replace('http', 'ws')}/ws"
         self.workspace_path = Path(workspace_path).resolve()
         self.session = requests.Session()
+        # 并发同步请求各自复用一条长连接；连接被服务器关闭等瞬时错误自动重试，
+        # 而不是重新走一遍编码和同步流程（POST只在请求未发出时重试）
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE,
+            pool_maxsize=HTTP_POOL_SIZE,
+            max_retries=Retry(total=HTTP_MAX_RETRIES, backoff_factor=0.2)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         self.ws_connection = None
+        self.checksum_algorithm = "md5"  # 连接服务器后按双方支持情况选择
+        self.raw_upload_supported = False  # 服务器是否支持原始二进制上传
+        self.msgpack_sync_supported = False  # 批量同步是否使用msgpack请求
+        self.metadata_query_supported = False  # 服务器能否确认远程文件未被改动，不能时不跳过任何文件
+        self.sync_cache_path = sync_cache_file(self.server_url)
+        self.sync_cache = self._load_sync_cache()  # 本地路径 -> {"remote", "mtime", "size", "hash"}
+        self.sync_cache_dirty = False
+        self.list_cache = TTLCache(LIST_CACHE_MAX_ENTRIES, LIST_CACHE_TTL)  # 远程目录 -> 文件列表
+        self.finished_commands = TTLCache(FINISHED_COMMAND_CACHE_MAX_ENTRIES)  # 命令ID -> 最终状态
         logger.info(f"MCP客户端初始化 - 服务器: {server_url}, 工作区: {workspace_path}")
     
     def connect(self):
@@ -51,8 +365,15 @@ class SimplifiedMCPClient:
         try:
             response = self.session.get(f"{self.server_url}/")
             if response.status_code == 200:
-                data = response.json()
+                data = json_loads(response.content)
                 logger.info(f"服务器信息: {data}")
+                
+                # 双方都支持blake3时使用更快的blake3校验和，否则保持md5
+                if BLAKE3_AVAILABLE and "blake3" in data.get("checksum_algorithms", []):
+                    self.checksum_algorithm = "blake3"
+                self.raw_upload_supported = data.get("raw_upload_supported", False)
+                self.msgpack_sync_supported = MSGPACK_AVAILABLE and data.get("msgpack_sync_supported", False)
+                self.metadata_query_supported = data.get("metadata_query_supported", False)
                 return True
             else:
                 logger.error(f"连接服务器失败: {response.status_code}")
@@ -68,8 +389,115 @@ class SimplifiedMCPClient:
             self.ws_connection.close()
             self.ws_connection = None
         
+        self._save_sync_cache()
         logger.info("已断开与服务器的连接")
     
+    def _load_sync_cache(self) -> Dict:
+        """加载本服务器的已同步文件状态缓存，不存在、损坏或属于其他服务器时返回空缓存"""
+        try:
+            data = json_loads(self.sync_cache_path.read_bytes())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"加载同步缓存失败: {self.sync_cache_path} - {str(e)}")
+            return {}
+        
+        if not isinstance(data, dict) or data.get("server_url") != self.server_url:
+            return {}
+        return data.get("files", {})
+    
+    def _save_sync_cache(self):
+        """保存已同步文件状态缓存"""
+        if not self.sync_cache_dirty:
+            return
+        
+        try:
+            self.sync_cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self.sync_cache_path.write_bytes(json_dumps({"server_url": self.server_url, "files": self.sync_cache}))
+            self.sync_cache_dirty = False
+        except OSError as e:
+            logger.warning(f"保存同步缓存失败: {self.sync_cache_path} - {str(e)}")
+    
+    def _synced_hash(self, local_path: Union[str, Path], remote_path: str, stat: os.stat_result) -> Optional[str]:
+        """
+        判断本地文件自上次同步到同一远程路径后是否未变化
+        
+        Args:
+            local_path: 本地文件路径
+            remote_path: 远程文件路径
+            stat: 本地文件的stat结果
+            
+        Returns:
+            mtime和大小均与上次同步时一致时返回服务器当时报告的完整哈希，否则返回None
+        """
+        entry = self.sync_cache.get(str(local_path))
+        if (entry is not None and entry["remote"] == remote_path
+                and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size):
+            return entry.get("hash")
+        return None
+    
+    def _record_synced(self, local_path: Union[str, Path], remote_path: str, stat: os.stat_result,
+                       full_hash: Optional[str]):
+        """
+        记录文件同步成功时的状态
+        
+        Args:
+            local_path: 本地文件路径
+            remote_path: 远程文件路径
+            stat: 本地文件的stat结果，需在读取文件内容之前获取
+            full_hash: 服务器返回的完整哈希，没有时无法确认远程文件，不记录
+        """
+        if full_hash:
+            self.sync_cache[str(local_path)] = {
+                "remote": remote_path,
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": full_hash
+            }
+        else:
+            self.sync_cache.pop(str(local_path), None)
+        self.sync_cache_dirty = True
+    
+    def _confirm_synced(self, candidates: List[Tuple[str, str, int]]) -> List[bool]:
+        """
+        向服务器批量确认远程文件仍是上次同步的内容
+        
+        远程文件被删除、在服务器上被修改或服务器重装后哈希不再一致，这些文件需要重新上传。
+        服务器不支持查询或请求失败时无法确认，全部视为需要上传。
+        
+        Args:
+            candidates: (远程路径, 上次同步时的完整哈希, 文件大小) 列表
+            
+        Returns:
+            与candidates一一对应，远程文件未被改动时为True
+        """
+        confirmed = [False] * len(candidates)
+        if not self.metadata_query_supported:
+            return confirmed
+        
+        for start in range(0, len(candidates), SYNC_CONFIRM_BATCH_FILES):
+            batch = candidates[start:start + SYNC_CONFIRM_BATCH_FILES]
+            try:
+                response = self.session.post(
+                    self.metadata_url,
+                    data=json_dumps({"paths": [remote_path for remote_path, _, _ in batch]}),
+                    headers=JSON_HEADERS
+                )
+                if response.status_code != 200:
+                    logger.warning(f"确认远程文件状态失败: {response.status_code} - {response.text}")
+                    continue
+                files = json_loads(response.content)["files"]
+            except Exception as e:
+                logger.warning(f"确认远程文件状态错误: {str(e)}")
+                continue
+            
+            # 结果顺序与请求中的路径顺序一致（测试模式下服务器返回映射后的路径）
+            for index, ((_, full_hash, size), remote) in enumerate(zip(batch, files), start):
+                confirmed[index] = (remote.get("exists", False) and remote.get("full_hash") == full_hash
+                                    and remote.get("size") == size)
+        
+        return confirmed
+    
     def list_files(self, remote_path: str) -> List[Dict]:
         """
         获取远程文件列表
@@ -80,14 +508,20 @@ class SimplifiedMCPClient:
         Returns:
             文件和目录列表
         """
+        cached = self.list_cache.get(remote_path)
+        if cached is not None:
+            return cached
+        
         try:
             response = self.session.get(
-                f"{self.server_url}/api/v1/files",
+                self.files_url,
                 params={"path": remote_path}
             )
             if response.status_code == 200:
-                data = response.json()
-                return data.get("files", [])
+                data = json_loads(response.content)
+                files = data.get("files", [])
+                self.list_cache.set(remote_path, files)
+                return files
             else:
                 error_text = response.text
                 logger.error(f"获取文件列表失败: {response.status_code} - {error_text}")
@@ -108,13 +542,13 @@ class SimplifiedMCPClient:
         """
         try:
             response = self.session.get(
-                f"{self.server_url}/api/v1/files/content",
+                self.file_content_url,
                 params={"path": remote_path}
             )
             if response.status_code == 200:
-                data = response.json()
+                data = json_loads(response.content)
                 encoded_content = data.get("content", "")
-                return base64.b64decode(encoded_content)
+                return b64decode(encoded_content)
             else:
                 error_text = response.text
                 logger.error(f"获取文件内容失败: {response.status_code} - {error_text}")
@@ -127,6 +561,8 @@ class SimplifiedMCPClient:
         """
         更新远程文件内容
         
+        服务器支持时以原始二进制上传，否则使用Base64编码的JSON请求。
+        
         Args:
             remote_path: 远程服务器上的文件路径
             content: 文件内容字节数据
@@ -134,34 +570,87 @@ class SimplifiedMCPClient:
         Returns:
             操作是否成功
         """
-        try:
-            # 计算MD5校验和
-            checksum = hashlib.md5(content).hexdigest()
+        return self._upload_file_content(remote_path, content) is not None
+    
+    def _upload_file_content(self, remote_path: str, content: bytes) -> Optional[Dict]:
+        """
+        上传文件内容，返回服务器的响应
+        
+        Args:
+            remote_path: 远程服务器上的文件路径
+            content: 文件内容字节数据
             
-            # Base64编码内容
-            encoded_content = base64.b64encode(content).decode('utf-8')
+        Returns:
+            包含写入后元数据的响应字典，失败时返回None
+        """
+        if self.raw_upload_supported:
+            return self._upload_file_content_raw(remote_path, content)
+        
+        try:
+            # Base64编码内容并计算校验和
+            encoded_content, checksum = encode_and_hash(content, self.checksum_algorithm)
             
             payload = {
                 "path": remote_path,
                 "content": encoded_content,
-                "checksum": checksum
+                "checksum": checksum,
+                "checksum_algorithm": self.checksum_algorithm
             }
             
             response = self.session.put(
-                f"{self.server_url}/api/v1/files/content",
-                json=payload
+                self.file_content_url,
+                data=json_dumps(payload),
+                headers=JSON_HEADERS
             )
             if response.status_code == 200:
-                data = response.json()
+                self.list_cache.invalidate_ancestors(remote_path)
                 logger.info(f"文件更新成功: {remote_path}")
-                return True
+                return json_loads(response.content)
             else:
                 error_text = response.text
                 logger.error(f"更新文件内容失败: {response.status_code} - {error_text}")
-                return False
+                return None
         except Exception as e:
             logger.error(f"更新文件内容错误: {str(e)}")
-            return False
+            return None
+    
+    def update_file_content_raw(self, remote_path: str, content: bytes) -> bool:
+        """
+        以原始二进制更新远程文件内容，省去Base64编解码和约三分之一的传输量
+        
+        Args:
+            remote_path: 远程服务器上的文件路径
+            content: 文件内容字节数据
+            
+        Returns:
+            操作是否成功
+        """
+        return self._upload_file_content_raw(remote_path, content) is not None
+    
+    def _upload_file_content_raw(self, remote_path: str, content: bytes) -> Optional[Dict]:
+        """以原始二进制上传文件内容，返回服务器的响应，失败时返回None"""
+        try:
+            response = self.session.put(
+                self.file_content_raw_url,
+                params={
+                    "path": remote_path,
+                    "checksum": content_checksum(content, self.checksum_algorithm),
+                    "checksum_algorithm": self.checksum_algorithm
+                },
+                data=content,
+                headers={"Content-Type": "application/octet-stream"}
+            )
+            if response.status_code == 200:
+                self.list_cache.invalidate_ancestors(remote_path)
+                logger.info(f"文件更新成功: {remote_path}")
+                return json_loads(response.content)
+            else:
+                error_text = response.text
+                logger.error(f"更新文件内容失败: {response.status_code} - {error_text}")
+                return None
+        except Exception as e:
+            logger.error(f"更新文件内容错误: {str(e)}")
+            return None
     
     def sync_files(self, file_changes: List[Dict]) -> Dict:
         """
@@ -174,40 +663,89 @@ class SimplifiedMCPClient:
             同步结果信息
         """
         try:
-            # 准备请求数据
-            files = []
-            for file_info in file_changes:
-                content = file_info.get("content", b"")
-                if isinstance(content, bytes):
-                    encoded_content = base64.b64encode(content).decode('utf-8')
-                    checksum = hashlib.md5(content).hexdigest()
-                else:
-                    encoded_content = content
-                    checksum = None
-                
-                files.append({
-                    "path": file_info["path"],
-                    "content": encoded_content,
-                    "checksum": checksum
-                })
+            # 准备请求数据；hashlib与pybase64处理时释放GIL，文件较多时用线程并行
+            binary = self.msgpack_sync_supported
+            if len(file_changes) >= PREPARE_PARALLEL_MIN_FILES:
+                with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
+                    files = list(executor.map(
+                        lambda file_info: prepare_sync_file(file_info, self.checksum_algorithm, binary),
+                        file_changes
+                    ))
+            else:
+                files = [prepare_sync_file(file_info, self.checksum_algorithm, binary) for file_info in file_changes]
             
-            payload = {"files": files}
+            # 按文件数和内容大小拆分为多个请求，服务器可以并行处理，单个请求也不会过大
+            chunks = []
+            chunk = []
+            chunk_bytes = 0
+            for file_item in files:
+                item_bytes = len(file_item["content"])
+                if chunk and (len(chunk) >= SYNC_REQUEST_MAX_FILES
+                              or chunk_bytes + item_bytes > SYNC_REQUEST_MAX_BYTES):
+                    chunks.append(chunk)
+                    chunk = []
+                    chunk_bytes = 0
+                chunk.append(file_item)
+                chunk_bytes += item_bytes
+            if chunk:
+                chunks.append(chunk)
             
-            response = self.session.post(
-                f"{self.server_url}/api/v1/files/sync",
-                json=payload
-            )
-            if response.status_code == 200:
-                data = response.json()
+            if len(chunks) > 1:
+                with ThreadPoolExecutor(max_workers=min(SYNC_HTTP_WORKERS, len(chunks))) as executor:
+                    results = list(executor.map(self._post_sync_chunk, chunks))
+            else:
+                results = [self._post_sync_chunk(chunk) for chunk in chunks]
+            
+            for file_item in files:
+                self.list_cache.invalidate_ancestors(file_item["path"])
+            
+            data = {"status": "success", "synchronized": 0, "failed": 0, "details": []}
+            for result in results:
+                if result.get("status") != "success":
+                    data["status"] = "error"
+                data["synchronized"] += result.get("synchronized", 0)
+                data["failed"] += result.get("failed", 0)
+                data["details"].extend(result.get("details", []))
+            
+            if data["status"] == "success":
                 logger.info(f"文件同步成功: {len(files)}个文件")
-                return data
+            return data
+        except Exception as e:
+            logger.error(f"批量同步文件错误: {str(e)}")
+            return {"status": "error", "synchronized": 0, "failed": len(file_changes)}
+    
+    def _post_sync_chunk(self, files: List[Dict]) -> Dict:
+        """
+        发送一个批量同步请求
+        
+        Args:
+            files: 已准备好的文件项列表
+            
+        Returns:
+            该请求的同步结果信息
+        """
+        try:
+            if self.msgpack_sync_supported:
+                response = self.session.post(
+                    self.sync_msgpack_url,
+                    data=msgpack.packb({"files": files}, use_bin_type=True, default=_msgpack_default),
+                    headers={"Content-Type": "application/msgpack"}
+                )
+            else:
+                response = self.session.post(
+                    self.sync_url,
+                    data=json_dumps({"files": files}),
+                    headers=JSON_HEADERS
+                )
+            if response.status_code == 200:
+                return json_loads(response.content)
             else:
                 error_text = response.text
                 logger.error(f"批量同步文件失败: {response.status_code} - {error_text}")
                 return {"status": "error", "synchronized": 0, "failed": len(files)}
         except Exception as e:
             logger.error(f"批量同步文件错误: {str(e)}")
-            return {"status": "error", "synchronized": 0, "failed": len(file_changes)}
+            return {"status": "error", "synchronized": 0, "failed": len(files)}
     
     def execute_command(self, command: str, working_dir: str, 
                        env: Optional[Dict[str, str]] = None,
@@ -233,11 +771,12 @@ class SimplifiedMCPClient:
             }
             
             response = self.session.post(
-                f"{self.server_url}/api/v1/commands",
-                json=payload
+                self.commands_url,
+                data=json_dumps(payload),
+                headers=JSON_HEADERS
             )
             if response.status_code == 200:
-                data = response.json()
+                data = json_loads(response.content)
                 logger.info(f"命令执行已提交: {command}")
                 return data
             else:
@@ -258,12 +797,18 @@ class SimplifiedMCPClient:
         Returns:
             命令状态信息
         """
+        cached = self.finished_commands.get(command_id)
+        if cached is not None:
+            return cached
+        
         try:
             response = self.session.get(
-                f"{self.server_url}/api/v1/commands/{command_id}"
+                f"{self.commands_url}/{command_id}"
             )
             if response.status_code == 200:
-                data = response.json()
+                data = json_loads(response.content)
+                if data.get("status") in FINISHED_COMMAND_STATUSES:
+                    self.finished_commands.set(command_id, data)
                 return data
             else:
                 error_text = response.text
@@ -273,22 +818,24 @@ class SimplifiedMCPClient:
             logger.error(f"获取命令状态错误: {str(e)}")
             return {"status": "unknown"}
     
-    def get_command_output(self, command_id: str) -> Dict:
+    def get_command_output(self, command_id: str, offset: int = 0) -> Dict:
         """
         获取命令执行输出
         
         Args:
             command_id: 命令ID
+            offset: 只获取该位置之后的输出，服务器支持时响应中带有输出总长度length
             
         Returns:
             命令输出信息
         """
         try:
             response = self.session.get(
-                f"{self.server_url}/api/v1/commands/{command_id}/output"
+                f"{self.commands_url}/{command_id}/output",
+                params={"offset": offset} if offset else None
             )
             if response.status_code == 200:
-                data = response.json()
+                data = json_loads(response.content)
                 return data
             else:
                 error_text = response.text
@@ -298,17 +845,17 @@ class SimplifiedMCPClient:
             logger.error(f"获取命令输出错误: {str(e)}")
             return {"output": "", "is_complete": True}
     
-    def connect_websocket(self, callback_function):
+    def connect_websocket(self, callback_function, opened: Optional[threading.Event] = None):
         """
         连接WebSocket获取实时通知
         
         Args:
             callback_function: 消息处理回调函数
+            opened: 可选的事件，连接建立后被设置
         """
-        ws_url = f"{self.server_url.replace('http', 'ws')}/ws"
         try:
             def on_message(ws, message):
-                data = json.loads(message)
+                data = json_loads(message)
                 callback_function(data)
             
             def on_error(ws, error):
@@ -318,9 +865,11 @@ class SimplifiedMCPClient:
                 logger.warning("WebSocket连接已关闭")
             
             def on_open(ws):
-                logger.info(f"WebSocket连接已建立: {ws_url}")
+                logger.info(f"WebSocket连接已建立: {self.ws_url}")
+                if opened is not None:
+                    opened.set()
             
-            self.ws_connection = websocket.WebSocketApp(ws_url,
+            self.ws_connection = websocket.WebSocketApp(self.ws_url,
                                                      on_message=on_message,
                                                      on_error=on_error,
                                                      on_close=on_close,
@@ -332,14 +881,18 @@ class SimplifiedMCPClient:
             logger.error(f"建立WebSocket连接错误: {str(e)}")
     
     def sync_local_to_remote(self, local_path: str, remote_path: str, 
-                            recursive: bool = True) -> Dict:
+                            recursive: bool = True, force: bool = False) -> Dict:
         """
         将本地目录或文件同步到远程
         
+        上次同步后mtime和大小均未变化、且服务器确认远程文件仍是上次上传内容的文件
+        不再读取和上传，计入结果中的skipped。
+        
         Args:
             local_path: 本地路径
             remote_path: 远程路径
             recursive: 是否递归同步子目录
+            force: 是否忽略同步缓存，上传所有文件
             
         Returns:
             同步结果信息
@@ -352,44 +905,246 @@ class SimplifiedMCPClient:
         if local_full_path.is_file():
             # 同步单个文件
             try:
-                with open(local_full_path, "rb") as f:
-                    content = f.read()
+                stat = local_full_path.stat()
+                full_hash = None if force else self._synced_hash(local_full_path, remote_path, stat)
+                if full_hash and self._confirm_synced([(remote_path, full_hash, stat.st_size)])[0]:
+                    return {"status": "success", "synchronized": 0, "failed": 0, "skipped": 1}
                 
-                result = self.update_file_content(remote_path, content)
+                content = map_file_content(local_full_path)
+                try:
+                    result = self._upload_file_content(remote_path, content)
+                finally:
+                    release_file_content(content)
+                if result is not None:
+                    self._record_synced(local_full_path, remote_path, stat,
+                                        result.get("metadata", {}).get("full_hash"))
                 return {
-                    "status": "success" if result else "error",
-                    "synchronized": 1 if result else 0,
-                    "failed": 0 if result else 1
+                    "status": "success" if result is not None else "error",
+                    "synchronized": 1 if result is not None else 0,
+                    "failed": 0 if result is not None else 1
                 }
             except Exception as e:
                 logger.error(f"同步文件错误: {str(e)}")
                 return {"status": "error", "synchronized": 0, "failed": 1}
         elif local_full_path.is_dir() and recursive:
-            # 递归同步目录
+            # 递归同步目录，按批映射和上传，内存占用与单批文件大小相关而非整个目录；
+            # 上一批在后台线程中哈希和上传时，主线程继续遍历和映射下一批文件
+            totals = {"status": "success", "synchronized": 0, "failed": 0, "skipped": 0, "details": []}
             file_changes = []
-            for root, dirs, files in os.walk(local_full_path):
-                for file in files:
-                    file_path = Path(root) / file
-                    rel_path = file_path.relative_to(local_full_path)
-                    remote_file_path = f"{remote_path}/{rel_path}"
+            candidates = []  # 本地未变化、等待服务器确认的 (本地路径, 远程路径, stat, 完整哈希)
+            with ThreadPoolExecutor(max_workers=1) as uploader:
+                pending = None
+                
+                def add_change(file_path: str, remote_file_path: str, stat: os.stat_result):
+                    """映射文件内容并加入待上传批次，批次满时交给后台线程上传"""
+                    nonlocal pending, file_changes
+                    try:
+                        # 空文件无需打开读取
+                        content = map_file_content(file_path) if stat.st_size else b""
+                    except Exception as e:
+                        logger.error(f"读取文件错误: {file_path} - {str(e)}")
+                        return
+                    
+                    file_changes.append({
+                        "path": remote_file_path,
+                        "content": content,
+                        "local_path": file_path,
+                        "stat": stat
+                    })
+                    if len(file_changes) >= SYNC_BATCH_FILES:
+                        if pending is not None:
+                            pending.result()
+                        pending = uploader.submit(self._sync_batch, file_changes, totals)
+                        file_changes = []
+                
+                def confirm_candidates():
+                    """批量确认本地未变化的文件，远程文件已被改动的重新上传"""
+                    confirmed = self._confirm_synced([
+                        (remote_file_path, full_hash, stat.st_size)
+                        for _, remote_file_path, stat, full_hash in candidates
+                    ])
+                    for (file_path, remote_file_path, stat, _), is_synced in zip(candidates, confirmed):
+                        if is_synced:
+                            totals["skipped"] += 1
+                        else:
+                            add_change(file_path, remote_file_path, stat)
+                    candidates.clear()
+                
+                root = str(local_full_path)
+                prefix_length = len(os.path.join(root, ""))
+                sync_cache_path = str(self.sync_cache_path)
+                for entry in iter_local_files(root):
+                    file_path = entry.path
+                    if file_path == sync_cache_path:
+                        continue
+                    remote_file_path = f"{remote_path}/{file_path[prefix_length:]}"
                     
                     try:
-                        with open(file_path, "rb") as f:
-                            content = f.read()
-                        
-                        file_changes.append({
-                            "path": remote_file_path,
-                            "content": content
-                        })
+                        stat = entry.stat()
                     except Exception as e:
                         logger.error(f"读取文件错误: {file_path} - {str(e)}")
-            
-            if file_changes:
-                return self.sync_files(file_changes)
-            else:
-                return {"status": "success", "synchronized": 0, "failed": 0}
+                        continue
+                    
+                    full_hash = None if force else self._synced_hash(file_path, remote_file_path, stat)
+                    if full_hash:
+                        candidates.append((file_path, remote_file_path, stat, full_hash))
+                        if len(candidates) >= SYNC_CONFIRM_BATCH_FILES:
+                            confirm_candidates()
+                    else:
+                        add_change(file_path, remote_file_path, stat)
+                
+                if candidates:
+                    confirm_candidates()
+                if pending is not None:
+                    pending.result()
+                if file_changes:
+                    self._sync_batch(file_changes, totals)
+            return totals
         else:
             return {"status": "error", "message": "不支持的路径类型或参数"}
+    
+    def _sync_batch(self, file_changes: List[Dict], totals: Dict) -> None:
+        """
+        同步一批已映射的文件并累加结果，完成后释放映射
+        
+        Args:
+            file_changes: 文件变更列表
+            totals: 累计的同步结果，原地更新
+        """
+        try:
+            result = self.sync_files(file_changes)
+        finally:
+            for file_info in file_changes:
+                release_file_content(file_info["content"])
+        
+        # 只记录服务器确认写入成功的文件；details与请求中的文件顺序一致
+        # （测试模式下服务器返回映射后的路径，因此按位置而非路径对应）
+        details = result.get("details", [])
+        if len(details) == len(file_changes):
+            for file_info, detail in zip(file_changes, details):
+                if detail.get("status") == "success":
+                    self._record_synced(file_info["local_path"], file_info["path"], file_info["stat"],
+                                        detail.get("full_hash"))
+        
+        if result.get("status") != "success":
+            totals["status"] = "error"
+        totals["synchronized"] += result.get("synchronized", 0)
+        totals["failed"] += result.get("failed", 0)
+        totals["details"].extend(result.get("details", []))
+
+
+# 等待WebSocket连接建立的超时(秒)，超时后退回HTTP轮询
+WS_CONNECT_TIMEOUT = 5.0
+# 超过该时间(秒)未收到本命令的消息时，通过HTTP补齐一次输出并确认命令是否已结束；
+# 命令没有输出时推送本来就会停顿，仍在运行时继续等待推送，只有连接断开才改为轮询
+WS_IDLE_TIMEOUT = 5.0
+
+
+def follow_command_ws(client: SimplifiedMCPClient, command_id: str,
+                      events: "queue.Queue", ws_thread: threading.Thread) -> Optional[int]:
+    """
+    通过WebSocket推送的消息实时打印命令输出，直到命令结束
+    
+    Args:
+        client: 客户端实例
+        command_id: 命令ID
+        events: 接收WebSocket消息的队列
+        ws_thread: 运行WebSocket连接的线程
+        
+    Returns:
+        命令结束时返回None；连接断开时返回已打印的输出长度，由调用方改为轮询
+    """
+    printed = 0  # 已打印的输出长度
+    received = 0  # 通过推送收到的输出长度，HTTP补齐过的部分再次推送时不重复打印
+    ends_with_newline = True
+    last_event = time.monotonic()
+    
+    def print_output(output: Dict) -> None:
+        """打印HTTP获取的printed之后的输出"""
+        nonlocal printed, ends_with_newline
+        tail = output.get("output", "")
+        if "length" not in output:
+            # 旧版服务器不支持offset，总是返回完整输出
+            tail = tail[printed:]
+        if tail:
+            print(tail, end="", flush=True)
+            printed += len(tail)
+            ends_with_newline = tail.endswith("\n")
+    
+    def print_completed(status: Dict) -> None:
+        """打印命令的结束状态"""
+        if not ends_with_newline:
+            print()
+        print(f"命令执行完成，状态: {status.get('status')}")
+        print(f"退出码: {status.get('exit_code')}")
+    
+    while True:
+        try:
+            data = events.get(timeout=1)
+        except queue.Empty:
+            if not ws_thread.is_alive():
+                return printed
+            if time.monotonic() - last_event > WS_IDLE_TIMEOUT:
+                # 长时间没有消息：命令可能只是没有输出，也可能推送已停滞，按服务器记录补齐
+                last_event = time.monotonic()
+                output = client.get_command_output(command_id, printed)
+                print_output(output)
+                if output.get("is_complete"):
+                    print_completed(client.get_command_status(command_id))
+                    return None
+            continue
+        
+        if data.get("command_id") != command_id:
+            continue
+        last_event = time.monotonic()
+        
+        if data.get("type") == "command_output":
+            content = data.get("content", "")
+            # 跳过已经通过HTTP补齐并打印过的部分
+            new_content = content[max(printed - received, 0):]
+            received += len(content)
+            if new_content:
+                print(new_content, end="", flush=True)
+                printed += len(new_content)
+                ends_with_newline = new_content.endswith("\n")
+        elif data.get("type") == "command_completed":
+            # 推送的消息可能不完整，按服务器记录的输出长度补齐剩余部分
+            print_output(client.get_command_output(command_id, printed))
+            print_completed(data)
+            return None
+
+
+def poll_command(client: SimplifiedMCPClient, command_id: str, printed: int = 0):
+    """
+    每秒轮询命令状态和输出，直到命令结束
+    
+    Args:
+        client: 客户端实例
+        command_id: 命令ID
+        printed: 已打印的输出长度
+    """
+    ends_with_newline = True
+    while True:
+        # 输出响应中带有is_complete，运行期间每轮只需一次请求，结束后再获取状态和退出码
+        output = client.get_command_output(command_id, printed)
+        new_output = output.get("output", "")
+        if "length" not in output:
+            # 旧版服务器不支持offset，总是返回完整输出
+            new_output = new_output[printed:]
+        if new_output:
+            print(new_output, end="", flush=True)
+            printed += len(new_output)
+            ends_with_newline = new_output.endswith("\n")
+        
+        if output.get("is_complete"):
+            if not ends_with_newline:
+                print()
+            status = client.get_command_status(command_id)
+            print(f"命令执行完成，状态: {status.get('status')}")
+            print(f"退出码: {status.get('exit_code')}")
+            return
+        
+        time.sleep(1)
 
 
 # 命令行功能
@@ -423,6 +1178,7 @@ def main():
     sync_parser = subparsers.add_parser("sync", help="同步目录")
     sync_parser.add_argument("local_path", help="本地目录路径")
     sync_parser.add_argument("remote_path", help="远程目录路径")
+    sync_parser.add_argument("--force", "-f", action="store_true", help="忽略同步缓存，上传所有文件")
     
     args = parser.parse_args()
     
@@ -459,26 +1215,38 @@ def main():
                 print(f"错误: 本地文件不存在: {local_path}")
                 return
             
-            with open(local_path, "rb") as f:
-                content = f.read()
-            
-            result = client.update_file_content(args.remote_path, content)
+            # 映射文件而不是整个读入内存，原始上传时由requests从映射中分块发送
+            content = map_file_content(local_path)
+            try:
+                result = client.update_file_content(args.remote_path, content)
+            finally:
+                release_file_content(content)
             if result:
                 print(f"文件已上传: {args.remote_path}")
             else:
                 print("上传文件失败")
         
         elif args.action == "sync":
-            result = client.sync_local_to_remote(args.local_path, args.remote_path)
+            result = client.sync_local_to_remote(args.local_path, args.remote_path, force=args.force)
             print(f"同步结果: {result['status']}")
             print(f"成功: {result.get('synchronized', 0)} 个文件")
             print(f"失败: {result.get('failed', 0)} 个文件")
+            print(f"未变化: {result.get('skipped', 0)} 个文件")
         
         elif args.command:
             if not args.dir:
                 print("错误: 执行命令需要指定工作目录 (--dir)")
                 return
             
+            # 先建立WebSocket连接再提交命令，避免错过命令开始时的输出
+            events = queue.Queue()
+            opened = threading.Event()
+            ws_thread = threading.Thread(
+                target=client.connect_websocket, args=(events.put,), kwargs={"opened": opened}, daemon=True
+            )
+            ws_thread.start()
+            ws_ready = opened.wait(WS_CONNECT_TIMEOUT)
+            
             result = client.execute_command(args.command, args.dir)
             command_id = result.get("command_id")
             if not command_id:
@@ -487,25 +1255,10 @@ def main():
             
             print(f"命令ID: {command_id}, 状态: {result.get('status')}")
             
-            # 轮询命令状态和输出
-            last_output_length = 0
-            while True:
-                status = client.get_command_status(command_id)
-                if status.get("status") in ["completed", "failed", "timeout"]:
-                    output = client.get_command_output(command_id)
-                    print(output.get("output", ""))
-                    print(f"命令执行完成，状态: {status.get('status')}")
-                    print(f"退出码: {status.get('exit_code')}")
-                    break
-                
-                # 获取当前输出
-                output = client.get_command_output(command_id)
-                current_output = output.get("output", "")
-                if len(current_output) > last_output_length:
-                    print(current_output[last_output_length:], end="", flush=True)
-                    last_output_length = len(current_output)
-                
-                time.sleep(1)
+            # 由服务器推送输出；WebSocket不可用或中途断开时退回HTTP轮询
+            printed = follow_command_ws(client, command_id, events, ws_thread) if ws_ready else 0
+            if printed is not None:
+                poll_command(client, command_id, printed)
         
         else:
             print("未指定操作，请使用 --help 查看帮助")
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+命令输出测试
+
+验证命令输出的分段存储、按偏移增量获取，以及客户端轮询对新旧服务器响应的处理，
+不需要启动服务器或真正执行命令。
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+# 导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import remote_server
+import simplified_client
+
+CHUNKS = ["hello ", "", "wörld\n", "x" * 100, "末尾"]
+FULL_OUTPUT = "".join(CHUNKS)
+
+
+@pytest.fixture
+def client():
+    """不触发启动和关闭事件的测试客户端，避免读写元数据缓存文件"""
+    return TestClient(remote_server.app)
+
+
+def new_command_info(status: str = "running") -> dict:
+    """与execute_command记录的结构相同的命令信息"""
+    return {"status": status, "output": [], "output_ends": []}
+
+
+@pytest.fixture
+def command(monkeypatch):
+    """已产生若干输出片段的运行中命令"""
+    command_info = new_command_info()
+    for text in CHUNKS:
+        remote_server.append_command_output(command_info, text)
+    monkeypatch.setitem(remote_server.active_commands, "cmd-1", command_info)
+    return command_info
+
+
+# 服务器：按偏移获取输出
+
+@pytest.mark.parametrize("offset", [0, 1, 6, 7, 12, 50, len(FULL_OUTPUT) - 1, len(FULL_OUTPUT), len(FULL_OUTPUT) + 5])
+def test_output_text_from_offset(command, offset):
+    """任意偏移处的结果都与完整输出的切片一致，并返回完整长度"""
+    assert remote_server.get_command_output_text(command, offset) == (FULL_OUTPUT[offset:], len(FULL_OUTPUT))
+
+
+def test_output_text_without_output():
+    """尚无输出时返回空文本"""
+    assert remote_server.get_command_output_text(new_command_info(), 0) == ("", 0)
+
+
+def test_output_endpoint_returns_output_after_offset(client, command):
+    """输出接口按offset返回增量输出、完整长度和是否结束"""
+    response = client.get("/api/v1/commands/cmd-1/output", params={"offset": 7})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "output": FULL_OUTPUT[7:], "offset": 7, "length": len(FULL_OUTPUT), "is_complete": False
+    }
+    assert client.get("/api/v1/commands/cmd-1/output", params={"offset": -3}).json()["output"] == FULL_OUTPUT
+    command["status"] = "completed"
+    assert client.get("/api/v1/commands/cmd-1/output").json()["is_complete"] is True
+
+
+def test_output_endpoint_unknown_command(client):
+    """命令不存在时返回404"""
+    assert client.get("/api/v1/commands/missing/output").status_code == 404
+
+
+# 服务器：读取子进程输出并合并广播
+
+@pytest.fixture
+def broadcasts(monkeypatch):
+    """记录广播的消息"""
+    messages = []
+    monkeypatch.setattr(remote_server.manager, "broadcast_nowait", messages.append)
+    return messages
+
+
+def run_read_stream(monkeypatch, chunks, delay=0.0) -> dict:
+    """将数据分块喂给read_stream，返回命令信息"""
+    command_info = new_command_info()
+    monkeypatch.setitem(remote_server.active_commands, "cmd-2", command_info)
+
+    async def main():
+        stream = asyncio.StreamReader()
+        reader = asyncio.create_task(remote_server.read_stream(stream, "cmd-2", "stdout"))
+        for chunk in chunks:
+            stream.feed_data(chunk)
+            await asyncio.sleep(delay)
+        stream.feed_eof()
+        await reader
+
+    asyncio.run(main())
+    return command_info
+
+
+def test_read_stream_coalesces_output_within_window(monkeypatch, broadcasts):
+    """时间窗口内的多段输出合并为一条消息，内容和顺序不变"""
+    monkeypatch.setattr(remote_server, "OUTPUT_FLUSH_INTERVAL", 10)
+    lines = [f"line {i}\n".encode() for i in range(50)]
+
+    command_info = run_read_stream(monkeypatch, lines, delay=0.001)
+
+    expected = b"".join(lines).decode()
+    assert len(broadcasts) == 1
+    assert broadcasts[0] == {"type": "command_output", "command_id": "cmd-2", "stream": "stdout", "content": expected}
+    assert remote_server.get_command_output_text(command_info) == (expected, len(expected))
+
+
+def test_read_stream_flushes_when_size_reached(monkeypatch, broadcasts):
+    """未广播的输出达到大小上限时立即广播，不等时间窗口结束"""
+    monkeypatch.setattr(remote_server, "OUTPUT_FLUSH_INTERVAL", 10)
+    monkeypatch.setattr(remote_server, "OUTPUT_FLUSH_SIZE", 10)
+
+    run_read_stream(monkeypatch, [b"12345", b"67890", b"abc"], delay=0.001)
+
+    assert [message["content"] for message in broadcasts] == ["1234567890", "abc"]
+
+
+def test_read_stream_flushes_after_window(monkeypatch, broadcasts):
+    """时间窗口结束时广播已积累的输出"""
+    monkeypatch.setattr(remote_server, "OUTPUT_FLUSH_INTERVAL", 0.01)
+
+    run_read_stream(monkeypatch, [b"first\n", b"second\n"], delay=0.1)
+
+    assert [message["content"] for message in broadcasts] == ["first\n", "second\n"]
+
+
+def test_read_stream_decodes_split_utf8(monkeypatch, broadcasts):
+    """跨块截断的多字节字符被正确拼接"""
+    data = "中文输出".encode("utf-8")
+
+    command_info = run_read_stream(monkeypatch, [data[:1], data[1:4], data[4:]], delay=0.001)
+
+    assert "".join(message["content"] for message in broadcasts) == "中文输出"
+    assert command_info["output_ends"][-1] == 4
+
+
+# 客户端：轮询输出
+
+class FakeCommandClient:
+    """按顺序返回预设输出响应的客户端，记录每次请求的offset"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.offsets = []
+
+    def get_command_output(self, command_id, offset=0):
+        self.offsets.append(offset)
+        return self.responses.pop(0)
+
+    def get_command_status(self, command_id):
+        return {"status": "completed", "exit_code": 0}
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """轮询间隔不实际等待"""
+    monkeypatch.setattr(simplified_client.time, "sleep", lambda seconds: None)
+
+
+def test_poll_command_prints_incremental_output(capsys, no_sleep):
+    """支持offset的服务器只返回新增输出，客户端按已打印长度请求"""
+    fake = FakeCommandClient([
+        {"output": "abc", "offset": 0, "length": 3, "is_complete": False},
+        {"output": "de\n", "offset": 3, "length": 6, "is_complete": True},
+    ])
+
+    simplified_client.poll_command(fake, "cmd-1")
+
+    assert fake.offsets == [0, 3]
+    assert capsys.readouterr().out.startswith("abcde\n命令执行完成，状态: completed\n")
+
+
+def test_poll_command_falls_back_for_old_server(capsys, no_sleep):
+    """旧版服务器忽略offset并总是返回完整输出，客户端只打印尚未打印的部分"""
+    fake = FakeCommandClient([
+        {"output": "abc", "is_complete": False},
+        {"output": "abc", "is_complete": False},
+        {"output": "abcdef", "is_complete": True},
+    ])
+
+    simplified_client.poll_command(fake, "cmd-1", printed=1)
+
+    assert fake.offsets == [1, 3, 3]
+    assert capsys.readouterr().out.startswith("bcdef\n命令执行完成")
+
+
+# 客户端：通过WebSocket推送跟踪输出
+
+class FakeThread:
+    """代替运行WebSocket连接的线程"""
+
+    def __init__(self, alive=True):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+
+@pytest.fixture
+def idle_timeout(monkeypatch):
+    """每次等待消息超时都视为空闲"""
+    monkeypatch.setattr(simplified_client, "WS_IDLE_TIMEOUT", 0)
+
+
+def output_message(content):
+    return {"type": "command_output", "command_id": "cmd-1", "stream": "stdout", "content": content}
+
+
+def test_follow_prints_pushed_output(capsys):
+    """推送的输出直接打印，命令结束时按已打印长度补齐剩余输出"""
+    events = simplified_client.queue.Queue()
+    events.put(output_message("ab"))
+    events.put({"type": "command_output", "command_id": "other", "content": "zz"})
+    events.put(output_message("c"))
+    events.put({"type": "command_completed", "command_id": "cmd-1", "status": "completed", "exit_code": 0})
+    fake = FakeCommandClient([{"output": "d\n", "offset": 3, "length": 5, "is_complete": True}])
+
+    assert simplified_client.follow_command_ws(fake, "cmd-1", events, FakeThread()) is None
+
+    assert fake.offsets == [3]
+    assert capsys.readouterr().out == "abcd\n命令执行完成，状态: completed\n退出码: 0\n"
+
+
+def test_follow_keeps_socket_when_idle(capsys, idle_timeout):
+    """空闲时通过HTTP补齐输出，命令仍在运行则继续等待推送，已补齐的部分不重复打印"""
+    events = simplified_client.queue.Queue()
+
+    class CatchUpClient(FakeCommandClient):
+        def get_command_output(self, command_id, offset=0):
+            if not self.offsets:
+                # 补齐之后，推送停滞期间积压的消息才到达
+                events.put(output_message("ab"))
+                events.put(output_message("cd"))
+                events.put({"type": "command_completed", "command_id": "cmd-1", "status": "completed", "exit_code": 0})
+            return super().get_command_output(command_id, offset)
+
+    fake = CatchUpClient([
+        {"output": "abc", "offset": 0, "length": 3, "is_complete": False},
+        {"output": "", "offset": 4, "length": 4, "is_complete": True},
+    ])
+
+    assert simplified_client.follow_command_ws(fake, "cmd-1", events, FakeThread()) is None
+
+    assert fake.offsets == [0, 4]
+    assert capsys.readouterr().out == "abcd\n命令执行完成，状态: completed\n退出码: 0\n"
+
+
+def test_follow_finishes_when_idle_command_completed(capsys, idle_timeout):
+    """空闲时发现命令已结束，打印剩余输出和状态"""
+    fake = FakeCommandClient([{"output": "done\n", "offset": 0, "length": 5, "is_complete": True}])
+
+    result = simplified_client.follow_command_ws(fake, "cmd-1", simplified_client.queue.Queue(), FakeThread())
+
+    assert result is None
+    assert capsys.readouterr().out == "done\n命令执行完成，状态: completed\n退出码: 0\n"
+
+
+def test_follow_falls_back_when_socket_closes(capsys):
+    """连接断开时返回已打印的长度，由调用方改为轮询"""
+    events = simplified_client.queue.Queue()
+    events.put(output_message("abc"))
+    fake = FakeCommandClient([])
+
+    assert simplified_client.follow_command_ws(fake, "cmd-1", events, FakeThread(alive=False)) == 3
+
+    assert fake.offsets == []
+    assert capsys.readouterr().out == "abc"
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+增量同步测试
+
+使用FastAPI的TestClient验证服务器返回的文件元数据与客户端delta_sync模块的计算结果一致，
+增量比较依赖两端的块哈希完全相同。
+"""
+
+import base64
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+# 导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import remote_server
+from delta_sync import DeltaSyncCalculator, FileMetadata, MetadataCache
+
+BLOCK_SIZE = remote_server.BLOCK_SIZE
+
+
+@pytest.fixture
+def client():
+    """不触发启动和关闭事件的测试客户端，避免读写元数据缓存文件"""
+    return TestClient(remote_server.app)
+
+
+def encode(data: bytes) -> str:
+    """Base64编码"""
+    return base64.b64encode(data).decode("ascii")
+
+
+def put_full(client, path, data: bytes) -> dict:
+    """以完整传输方式上传文件，返回服务器生成的元数据"""
+    response = client.put("/api/v1/files/delta", json={
+        "path": str(path), "delta_type": "full", "full_hash": "", "size": len(data), "content": encode(data)
+    })
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["status"] == "success", result
+    return result["metadata"]
+
+
+def assert_matches_client(metadata: dict, path, algorithm: str = "md5"):
+    """服务器元数据与客户端从同一文件计算的元数据一致"""
+    expected = FileMetadata.from_file(str(path), BLOCK_SIZE, algorithm)
+    assert metadata["size"] == expected.size
+    assert metadata["full_hash"] == expected.full_hash
+    assert metadata["blocks"] == {str(index): block_hash for index, block_hash in expected.blocks.items()}
+
+
+# 元数据哈希算法：客户端按服务器报告的算法计算
+
+@pytest.mark.parametrize("algorithm", ["md5", "sha1", "sha256"])
+def test_metadata_follows_server_hash_algorithm(client, tmp_path, monkeypatch, algorithm):
+    """服务器配置的哈希算法通过根路由报告，客户端按该算法计算后判断文件未变更"""
+    monkeypatch.setitem(remote_server.SERVER_CONFIG, "hash_algorithm", algorithm)
+    assert client.get("/").json()["hash_algorithm"] == algorithm
+    local_path = tmp_path / "local.bin"
+    local_path.write_bytes(os.urandom(3 * BLOCK_SIZE + 10))
+
+    metadata = put_full(client, tmp_path / f"remote-{algorithm}.bin", local_path.read_bytes())
+
+    assert_matches_client(metadata, local_path, algorithm)
+    cache = MetadataCache(str(tmp_path / "cache.json"))
+    cache.update_remote_metadata(FileMetadata.from_dict(metadata))
+    calculator = DeltaSyncCalculator(cache, BLOCK_SIZE, algorithm)
+    assert calculator.calculate_delta(str(local_path), metadata["path"])["type"] == "none"
+
+
+def test_calculator_rehashes_cached_metadata_of_other_algorithm(tmp_path):
+    """缓存的本地元数据使用其他算法时重新计算，而不是拿不同算法的哈希比较"""
+    local_path = tmp_path / "local.bin"
+    local_path.write_bytes(b"content")
+    cache = MetadataCache(str(tmp_path / "cache.json"))
+    cache.update_local_metadata(str(local_path), BLOCK_SIZE, "md5")
+    remote = FileMetadata.from_file(str(local_path), BLOCK_SIZE, "sha256")
+    remote.path = "/remote/local.bin"
+    cache.update_remote_metadata(remote)
+
+    calculator = DeltaSyncCalculator(cache, BLOCK_SIZE, "sha256")
+
+    assert calculator.calculate_delta(str(local_path), "/remote/local.bin")["type"] == "none"
+
+
+# 增量更新：先完整上传，再通过JSON增量替换、追加和截断块
+
+def put_delta(client, path, blocks: dict, size: int) -> dict:
+    """以JSON增量方式上传变更块，返回处理结果"""
+    response = client.put("/api/v1/files/delta", json={
+        "path": str(path), "delta_type": "delta", "full_hash": "", "size": size,
+        "blocks": {str(index): encode(data) for index, data in blocks.items()}
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def apply_blocks(data: bytes, blocks: dict, size: int) -> bytes:
+    """在内存中按块应用增量，得到预期的文件内容"""
+    result = bytearray(data)
+    for index, block in blocks.items():
+        start = index * BLOCK_SIZE
+        if len(result) < start:
+            result += b"\0" * (start - len(result))
+        result[start:start + len(block)] = block
+    del result[size:]
+    return bytes(result)
+
+
+@pytest.mark.parametrize("blocks, size", [
+    # 替换中间的块，大小不变
+    ({1: b"r" * BLOCK_SIZE}, 4 * BLOCK_SIZE + 100),
+    # 补全末尾的不完整块并追加新块
+    ({4: b"a" * BLOCK_SIZE, 5: b"b" * BLOCK_SIZE, 6: b"c" * 10}, 6 * BLOCK_SIZE + 10),
+    # 跳过中间的块追加，空缺部分补零
+    ({7: b"z" * 50}, 7 * BLOCK_SIZE + 50),
+    # 截断：重写新的末尾块，之后的块被删除
+    ({1: b"t" * 300}, BLOCK_SIZE + 300),
+    # 替换第一个块并截断到块边界
+    ({0: b"s" * BLOCK_SIZE}, BLOCK_SIZE),
+])
+def test_delta_updates_file_and_metadata(client, tmp_path, blocks, size):
+    """增量写入后文件内容正确，返回的元数据与客户端从结果文件计算的一致"""
+    data = os.urandom(4 * BLOCK_SIZE + 100)
+    path = tmp_path / "delta.bin"
+    put_full(client, path, data)
+
+    result = put_delta(client, path, blocks, size)
+
+    assert result["status"] == "success", result
+    assert path.read_bytes() == apply_blocks(data, blocks, size)
+    assert_matches_client(result["metadata"], path)
+
+
+def test_delta_after_external_change_rehashes_file(client, tmp_path):
+    """文件在服务器之外被修改后缓存失效，增量写入后从磁盘重新计算元数据"""
+    path = tmp_path / "external.bin"
+    put_full(client, path, os.urandom(3 * BLOCK_SIZE))
+    data = os.urandom(2 * BLOCK_SIZE + 7)
+    path.write_bytes(data)
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1_000_000))
+    blocks = {1: b"e" * BLOCK_SIZE}
+
+    result = put_delta(client, path, blocks, len(data))
+
+    assert result["status"] == "success", result
+    assert path.read_bytes() == apply_blocks(data, blocks, len(data))
+    assert_matches_client(result["metadata"], path)
+
+
+def test_delta_without_size_only_extends(client, tmp_path):
+    """未给出文件大小时保持原有行为，只在写入超过末尾时扩展文件"""
+    data = os.urandom(2 * BLOCK_SIZE)
+    path = tmp_path / "nosize.bin"
+    put_full(client, path, data)
+
+    result = put_delta(client, path, {0: b"n" * 10}, 0)
+
+    assert result["status"] == "success", result
+    assert path.read_bytes() == b"n" * 10 + data[10:]
+    assert_matches_client(result["metadata"], path)
+
+
+def test_delta_missing_file_reports_error(client, tmp_path):
+    """目标文件不存在时在结果中报告错误，不创建文件"""
+    path = tmp_path / "missing.bin"
+
+    result = put_delta(client, path, {0: b"x"}, 1)
+
+    assert result["status"] == "error"
+    assert not path.exists()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+文件内容写入测试
+
+使用FastAPI的TestClient验证JSON格式的content和sync端点，内容与磁盘上的文件相同时
+跳过写入且不广播变更，不需要启动服务器。
+"""
+
+import base64
+import hashlib
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+# 导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import remote_server
+
+
+@pytest.fixture
+def client():
+    """不触发启动和关闭事件的测试客户端，避免读写元数据缓存文件"""
+    return TestClient(remote_server.app)
+
+
+@pytest.fixture
+def broadcasts(monkeypatch):
+    """记录广播的文件变更事件"""
+    events = []
+
+    async def record_file(path):
+        events.append(path)
+
+    async def record_files(files):
+        events.extend(item["path"] for item in files)
+
+    monkeypatch.setattr(remote_server, "broadcast_file_changed", record_file)
+    monkeypatch.setattr(remote_server, "broadcast_files_changed", record_files)
+    return events
+
+
+def file_item(path, data: bytes, checksum: bool = True) -> dict:
+    """JSON请求中的文件项"""
+    item = {"path": str(path), "content": base64.b64encode(data).decode("ascii")}
+    if checksum:
+        item["checksum"] = hashlib.md5(data).hexdigest()
+    return item
+
+
+def put_content(client, path, data: bytes, checksum: bool = True) -> dict:
+    """以JSON请求上传文件内容"""
+    response = client.put("/api/v1/files/content", json=file_item(path, data, checksum))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.mark.parametrize("checksum", [True, False])
+def test_content_skips_unchanged_content(client, tmp_path, broadcasts, checksum):
+    """内容与磁盘上的文件相同时跳过写入，文件保持不变且不广播变更"""
+    data = os.urandom(5000)
+    path = tmp_path / "same.bin"
+    first = put_content(client, path, data, checksum)
+    mtime_ns = path.stat().st_mtime_ns
+
+    second = put_content(client, path, data, checksum)
+
+    assert "skipped" not in first and second["skipped"] is True
+    assert second["metadata"]["full_hash"] == first["metadata"]["full_hash"]
+    assert path.stat().st_mtime_ns == mtime_ns
+    assert broadcasts == [str(path)]
+
+
+def test_content_rewrites_changed_content_of_same_size(client, tmp_path, broadcasts):
+    """大小相同但内容不同时照常写入"""
+    path = tmp_path / "changed.bin"
+    put_content(client, path, b"a" * 100)
+
+    result = put_content(client, path, b"b" * 100)
+
+    assert "skipped" not in result
+    assert path.read_bytes() == b"b" * 100
+    assert broadcasts == [str(path), str(path)]
+
+
+def test_content_rewrites_file_changed_on_disk(client, tmp_path):
+    """文件在服务器之外被修改后缓存失效，即使上传的内容与上次相同也会写入"""
+    path = tmp_path / "external.bin"
+    put_content(client, path, b"original")
+    path.write_bytes(b"modified outside")
+
+    result = put_content(client, path, b"original")
+
+    assert "skipped" not in result
+    assert path.read_bytes() == b"original"
+
+
+def test_sync_skips_unchanged_files(client, tmp_path, broadcasts):
+    """批量同步时未变化的文件同样成功，只广播内容发生变化的文件"""
+    same = tmp_path / "same.txt"
+    changed = tmp_path / "changed.txt"
+    put_content(client, same, b"same")
+    put_content(client, changed, b"old")
+    broadcasts.clear()
+
+    response = client.post("/api/v1/files/sync", json={"files": [
+        file_item(same, b"same"), file_item(changed, b"new")
+    ]})
+
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["synchronized"] == 2 and result["failed"] == 0
+    assert changed.read_bytes() == b"new"
+    assert broadcasts == [str(changed)]
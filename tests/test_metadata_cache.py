@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+文件元数据缓存测试
+
+验证未变化的文件直接使用缓存的元数据，以及缓存的保存、重新加载和失效，
+缓存文件写入临时目录。
+"""
+
+import asyncio
+import os
+import sys
+from collections import OrderedDict
+
+import pytest
+
+# 导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import remote_server
+
+
+@pytest.fixture(autouse=True)
+def metadata_cache(tmp_path, monkeypatch):
+    """使用空的元数据缓存，缓存文件写入临时目录"""
+    cache = OrderedDict()
+    monkeypatch.setattr(remote_server, "file_metadata_cache", cache)
+    monkeypatch.setattr(remote_server, "metadata_cache_dirty", False)
+    monkeypatch.setattr(remote_server, "CACHE_FILE", tmp_path / "cache" / ".remote_cache.json")
+    (tmp_path / "cache").mkdir()
+    return cache
+
+
+def generate(path) -> dict:
+    """生成文件元数据"""
+    return asyncio.run(remote_server.generate_file_metadata(str(path)))
+
+
+def make_file(tmp_path, name: str, data: bytes = b"content"):
+    """创建测试文件"""
+    path = tmp_path / name
+    path.write_bytes(data)
+    return path
+
+
+def reload_cache(metadata_cache):
+    """模拟服务器重启：清空内存中的缓存后从缓存文件加载"""
+    metadata_cache.clear()
+    remote_server.load_metadata_cache()
+
+
+# 未变化的文件使用缓存
+
+def test_unchanged_file_uses_cached_metadata(tmp_path, monkeypatch):
+    """文件的mtime和大小未变时直接返回缓存，不再读取文件计算哈希"""
+    path = make_file(tmp_path, "a.bin", os.urandom(10000))
+    first = generate(path)
+
+    def fail(*args):
+        raise AssertionError("未变化的文件不应重新计算哈希")
+
+    monkeypatch.setattr(remote_server, "_stream_file_hashes", fail)
+    assert generate(path) is first
+
+
+def test_changed_file_is_rehashed(tmp_path):
+    """文件被修改后缓存失效，重新计算元数据"""
+    path = make_file(tmp_path, "a.bin", b"before")
+    first = generate(path)
+    path.write_bytes(b"after, longer")
+
+    second = generate(path)
+
+    assert second["size"] == len(b"after, longer")
+    assert second["full_hash"] != first["full_hash"]
+    assert remote_server.get_cached_metadata(str(path)) is second
+
+
+# 保存与重新加载
+
+def test_saved_cache_is_reloaded(tmp_path, metadata_cache):
+    """保存的缓存在重启后加载，仍有效的条目无需重新计算"""
+    path = make_file(tmp_path, "a.bin")
+    metadata = generate(path)
+    remote_server.save_metadata_cache(dict(metadata_cache))
+
+    reload_cache(metadata_cache)
+
+    assert remote_server.get_cached_metadata(str(path)) == metadata
+
+
+def test_reloaded_entry_for_modified_file_is_not_used(tmp_path, metadata_cache):
+    """重启期间被修改的文件，加载的条目不会被使用"""
+    path = make_file(tmp_path, "a.bin", b"before")
+    generate(path)
+    remote_server.save_metadata_cache(dict(metadata_cache))
+    path.write_bytes(b"after restart")
+
+    reload_cache(metadata_cache)
+
+    assert remote_server.get_cached_metadata(str(path)) is None
+    assert generate(path)["size"] == len(b"after restart")
+
+
+def test_cache_of_other_hash_algorithm_is_ignored(tmp_path, metadata_cache, monkeypatch):
+    """哈希算法变更后不加载旧缓存"""
+    path = make_file(tmp_path, "a.bin")
+    generate(path)
+    remote_server.save_metadata_cache(dict(metadata_cache))
+    monkeypatch.setitem(remote_server.SERVER_CONFIG, "hash_algorithm", "sha256")
+
+    reload_cache(metadata_cache)
+
+    assert len(metadata_cache) == 0
+    assert len(generate(path)["full_hash"]) == 64
+
+
+def test_corrupt_cache_file_is_ignored(metadata_cache):
+    """缓存文件损坏时以空缓存启动"""
+    remote_server.CACHE_FILE.write_bytes(b"{not json")
+
+    reload_cache(metadata_cache)
+
+    assert len(metadata_cache) == 0
+
+
+# 定期保存与条目上限
+
+def test_cache_is_pruned_least_recently_used(tmp_path, metadata_cache, monkeypatch):
+    """超过上限时淘汰最久未使用的条目，重新加载时同样遵守上限"""
+    monkeypatch.setattr(remote_server, "METADATA_CACHE_MAX_ENTRIES", 2)
+    paths = [make_file(tmp_path, name) for name in ("a", "b", "c")]
+    generate(paths[0])
+    generate(paths[1])
+    remote_server.get_cached_metadata(str(paths[0]))  # a成为最近使用
+
+    generate(paths[2])
+
+    assert list(metadata_cache) == [str(paths[0]), str(paths[2])]
+    monkeypatch.setattr(remote_server, "METADATA_CACHE_MAX_ENTRIES", 3)
+    generate(paths[1])
+    remote_server.save_metadata_cache(dict(metadata_cache))
+    monkeypatch.setattr(remote_server, "METADATA_CACHE_MAX_ENTRIES", 2)
+    reload_cache(metadata_cache)
+    assert list(metadata_cache) == [str(paths[2]), str(paths[1])]
+
+
+def test_save_replaces_cache_file_atomically(tmp_path, metadata_cache):
+    """保存通过临时文件替换，不留下临时文件"""
+    remote_server.CACHE_FILE.write_bytes(b"old")
+    generate(make_file(tmp_path, "a.bin"))
+
+    remote_server.save_metadata_cache(dict(metadata_cache))
+
+    assert os.listdir(remote_server.CACHE_FILE.parent) == [remote_server.CACHE_FILE.name]
+    assert remote_server.CACHE_FILE.read_bytes() != b"old"
+
+
+def test_persist_saves_only_when_dirty(tmp_path, monkeypatch):
+    """有变更时定期保存并清除变更标记，没有变更时不写入"""
+    monkeypatch.setattr(remote_server, "METADATA_CACHE_SAVE_INTERVAL", 0.01)
+
+    async def run_persist():
+        task = asyncio.create_task(remote_server.persist_metadata_cache())
+        await asyncio.sleep(0.05)
+        assert not remote_server.CACHE_FILE.exists()
+
+        await remote_server.generate_file_metadata(str(make_file(tmp_path, "a.bin")))
+        assert remote_server.metadata_cache_dirty
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if remote_server.CACHE_FILE.exists():
+                break
+        task.cancel()
+
+    asyncio.run(run_persist())
+
+    assert remote_server.CACHE_FILE.exists()
+    assert not remote_server.metadata_cache_dirty
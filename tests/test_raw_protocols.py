@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+二进制上传协议测试
+
+使用FastAPI的TestClient验证content_raw、delta_raw和sync_msgpack端点的请求格式、
+校验和规则和错误处理，不需要启动服务器。
+"""
+
+import hashlib
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+# 导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import remote_server
+
+BLOCK_SIZE = remote_server.BLOCK_SIZE
+
+
+@pytest.fixture
+def client():
+    """不触发启动和关闭事件的测试客户端，避免读写元数据缓存文件"""
+    return TestClient(remote_server.app)
+
+
+@pytest.fixture
+def stream_threshold(monkeypatch):
+    """调低流式上传阈值，使测试用的小文件也走临时文件路径"""
+    monkeypatch.setattr(remote_server, "STREAM_UPLOAD_THRESHOLD", 64 * 1024)
+    monkeypatch.setattr(remote_server, "STREAM_WRITE_SIZE", 16 * 1024)
+    return 64 * 1024
+
+
+def put_raw(client, path, content, **params):
+    """以原始二进制上传文件内容"""
+    return client.put(
+        "/api/v1/files/content_raw",
+        params={"path": str(path), **params},
+        content=content,
+        headers={"Content-Type": "application/octet-stream"}
+    )
+
+
+# content_raw：阈值以下，在内存中处理
+
+def test_content_raw_round_trip(client, tmp_path):
+    """上传后文件内容和返回的元数据与原始内容一致"""
+    data = os.urandom(10000)
+    path = tmp_path / "sub" / "small.bin"
+
+    response = put_raw(client, path, data, checksum=hashlib.md5(data).hexdigest())
+
+    assert response.status_code == 200, response.text
+    assert path.read_bytes() == data
+    metadata = response.json()["metadata"]
+    assert metadata["full_hash"] == hashlib.md5(data).hexdigest()
+    assert len(metadata["blocks"]) == 3
+
+
+def test_content_raw_skips_unchanged_content(client, tmp_path):
+    """内容与磁盘上的文件相同时跳过写入"""
+    data = os.urandom(5000)
+    path = tmp_path / "same.bin"
+    assert put_raw(client, path, data).status_code == 200
+
+    response = put_raw(client, path, data)
+
+    assert response.status_code == 200
+    assert response.json().get("skipped") is True
+
+
+def test_content_raw_rejects_bad_checksum(client, tmp_path):
+    """校验和不匹配时返回400且不写入文件"""
+    path = tmp_path / "bad.bin"
+
+    response = put_raw(client, path, b"payload", checksum="0" * 32)
+
+    assert response.status_code == 400
+    assert not path.exists()
+
+
+def test_content_raw_rejects_unknown_checksum_algorithm(client, tmp_path):
+    """不支持的校验和算法返回400"""
+    response = put_raw(client, tmp_path / "algo.bin", b"payload", checksum="00", checksum_algorithm="crc32")
+
+    assert response.status_code == 400
+
+
+@pytest.mark.skipif(not remote_server.BLAKE3_AVAILABLE, reason="未安装blake3")
+def test_content_raw_accepts_blake3_checksum(client, tmp_path):
+    """服务器支持blake3时可以用它作为上传校验和"""
+    data = os.urandom(3000)
+    path = tmp_path / "b3.bin"
+
+    response = put_raw(client, path, data, checksum=remote_server.blake3(data).hexdigest(),
+                       checksum_algorithm="blake3")
+
+    assert response.status_code == 200, response.text
+    assert path.read_bytes() == data
+
+
+# content_raw：超过阈值或未声明长度时流式写入临时文件
+
+def test_content_raw_streams_large_upload(client, tmp_path, stream_threshold):
+    """超过阈值的上传写入后内容、权限和元数据正确，且不留下临时文件"""
+    data = os.urandom(stream_threshold * 3 + 123)
+    path = tmp_path / "large.bin"
+    path.write_bytes(b"old")
+    path.chmod(0o640)
+
+    response = put_raw(client, path, data, checksum=hashlib.md5(data).hexdigest())
+
+    assert response.status_code == 200, response.text
+    assert path.read_bytes() == data
+    assert path.stat().st_mode & 0o777 == 0o640
+    metadata = response.json()["metadata"]
+    assert metadata["full_hash"] == hashlib.md5(data).hexdigest()
+    assert len(metadata["blocks"]) == -(-len(data) // BLOCK_SIZE)
+    assert os.listdir(tmp_path) == ["large.bin"]
+
+
+def test_content_raw_stream_bad_checksum_keeps_old_file(client, tmp_path, stream_threshold):
+    """流式上传校验失败时返回400，原文件保持不变并清理临时文件"""
+    path = tmp_path / "keep.bin"
+    path.write_bytes(b"original")
+
+    response = put_raw(client, path, os.urandom(stream_threshold + 1), checksum="0" * 32)
+
+    assert response.status_code == 400
+    assert path.read_bytes() == b"original"
+    assert os.listdir(tmp_path) == ["keep.bin"]
+
+
+def test_content_raw_streams_chunked_body(client, tmp_path):
+    """未声明Content-Length的分块请求体总是流式写入"""
+    data = os.urandom(200000)
+    path = tmp_path / "chunked.bin"
+
+    def body():
+        for start in range(0, len(data), 30000):
+            yield data[start:start + 30000]
+
+    response = put_raw(client, path, body(), checksum=hashlib.md5(data).hexdigest())
+
+    assert response.status_code == 200, response.text
+    assert path.read_bytes() == data
+
+
+# delta_raw：块内容按顺序拼接在请求体中，索引和长度通过请求头传递
+
+def put_delta(client, path, body, indices, lengths):
+    """以原始二进制上传增量块"""
+    return client.put(
+        "/api/v1/files/delta_raw",
+        params={"path": str(path)},
+        content=body,
+        headers={"X-Block-Indices": indices, "X-Block-Lengths": lengths}
+    )
+
+
+def test_delta_raw_replaces_and_appends_blocks(client, tmp_path):
+    """替换中间块并在末尾之后追加块，空缺部分补零"""
+    data = os.urandom(10000)
+    path = tmp_path / "delta.bin"
+    path.write_bytes(data)
+    block1 = os.urandom(BLOCK_SIZE)
+    block3 = os.urandom(100)
+
+    response = put_delta(client, path, block1 + block3, "1,3", f"{BLOCK_SIZE},100")
+
+    assert response.status_code == 200, response.text
+    expected = bytearray(data)
+    expected[BLOCK_SIZE:2 * BLOCK_SIZE] = block1
+    expected += b"\0" * (3 * BLOCK_SIZE - len(expected))
+    expected += block3
+    assert path.read_bytes() == bytes(expected)
+    assert response.json()["metadata"]["full_hash"] == hashlib.md5(bytes(expected)).hexdigest()
+
+
+def test_delta_raw_rejects_length_mismatch(client, tmp_path):
+    """请求体长度与块长度之和不一致时返回400"""
+    path = tmp_path / "delta.bin"
+    path.write_bytes(b"x" * 100)
+
+    response = put_delta(client, path, b"abc", "0", "2")
+
+    assert response.status_code == 400
+    assert path.read_bytes() == b"x" * 100
+
+
+def test_delta_raw_rejects_count_mismatch(client, tmp_path):
+    """块索引与块长度数量不一致时返回400"""
+    path = tmp_path / "delta.bin"
+    path.write_bytes(b"x" * 100)
+
+    response = put_delta(client, path, b"ab", "0,1", "2")
+
+    assert response.status_code == 400
+
+
+def test_delta_raw_rejects_malformed_headers(client, tmp_path):
+    """无法解析的块索引返回400，缺少请求头返回422"""
+    path = tmp_path / "delta.bin"
+    path.write_bytes(b"x" * 100)
+
+    assert put_delta(client, path, b"ab", "zero", "2").status_code == 400
+    response = client.put("/api/v1/files/delta_raw", params={"path": str(path)}, content=b"ab")
+    assert response.status_code == 422
+
+
+def test_delta_raw_missing_file_reports_error(client, tmp_path):
+    """目标文件不存在时在结果中报告错误，不创建文件"""
+    path = tmp_path / "missing.bin"
+
+    response = put_delta(client, path, b"ab", "0", "2")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "error"
+    assert not path.exists()
+
+
+# sync_msgpack：与/api/v1/files/sync格式相同，content为二进制
+
+def test_sync_msgpack_round_trip(client, tmp_path):
+    """逐个文件校验并写入，失败的文件单独报告"""
+    msgpack = pytest.importorskip("msgpack")
+    assert client.get("/").json()["msgpack_sync_supported"] is True
+    good = os.urandom(5000)
+    body = msgpack.packb({"files": [
+        {"path": str(tmp_path / "m" / "good"), "content": good, "checksum": hashlib.md5(good).hexdigest()},
+        {"path": str(tmp_path / "m" / "empty"), "content": b""},
+        {"path": str(tmp_path / "m" / "bad"), "content": b"x", "checksum": "0" * 32},
+    ]}, use_bin_type=True)
+
+    response = client.post("/api/v1/files/sync_msgpack", content=body,
+                           headers={"Content-Type": "application/msgpack"})
+
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["synchronized"] == 2 and result["failed"] == 1
+    assert [detail["status"] for detail in result["details"]] == ["success", "success", "error"]
+    assert (tmp_path / "m" / "good").read_bytes() == good
+    assert (tmp_path / "m" / "empty").read_bytes() == b""
+    assert not (tmp_path / "m" / "bad").exists()
+
+
+def test_sync_msgpack_rejects_malformed_body(client, tmp_path):
+    """请求体无法解析或文件项字段类型不对时返回400"""
+    msgpack = pytest.importorskip("msgpack")
+
+    assert client.post("/api/v1/files/sync_msgpack", content=b"\xc1").status_code == 400
+    assert client.post("/api/v1/files/sync_msgpack", content=msgpack.packb({"nofiles": []})).status_code == 400
+    body = msgpack.packb({"files": [{"path": str(tmp_path / "s"), "content": "text"}]}, use_bin_type=True)
+    assert client.post("/api/v1/files/sync_msgpack", content=body).status_code == 400
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+简化客户端测试
+
+客户端的HTTP会话替换为FastAPI的TestClient，请求直接交给服务器应用处理，
+不需要启动服务器。
+"""
+
+import json
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+# 导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import remote_server
+import simplified_client
+from simplified_client import SimplifiedMCPClient
+
+
+class AppSession:
+    """以requests.Session的调用方式把请求交给服务器应用"""
+
+    def __init__(self, base_url: str):
+        self.client = TestClient(remote_server.app, base_url=base_url)
+        self.requests = []  # (方法, URL, 请求体)
+
+    def request(self, method: str, url: str, data=None, **kwargs):
+        # requests可以直接发送mmap等缓冲区对象，httpx只接受bytes
+        if data is not None:
+            kwargs["content"] = bytes(data)
+        self.requests.append((method, url, kwargs.get("content")))
+        return self.client.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def close(self):
+        self.client.close()
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """同步缓存写入临时目录"""
+    path = tmp_path / "cache"
+    monkeypatch.setattr(simplified_client, "SYNC_CACHE_DIR", path)
+    return path
+
+
+@pytest.fixture
+def make_client(tmp_path, cache_dir):
+    """创建连接到测试服务器应用的客户端"""
+    clients = []
+
+    def make(server_url="http://testserver"):
+        client = SimplifiedMCPClient(server_url, str(tmp_path))
+        client.session = AppSession(server_url)
+        assert client.connect()
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.session.close()
+
+
+@pytest.fixture
+def local_dir(tmp_path):
+    """包含几个文件的本地目录"""
+    path = tmp_path / "local"
+    (path / "sub").mkdir(parents=True)
+    for name in ("a.txt", "b.txt", "sub/c.txt"):
+        (path / name).write_bytes(os.urandom(2000))
+    return path
+
+
+# 同步缓存：本地未变化的文件经服务器确认后跳过
+
+def test_second_sync_skips_confirmed_files(make_client, local_dir, tmp_path, cache_dir):
+    """第二次同步时服务器确认远程文件未变，全部跳过；缓存不写入工作区"""
+    remote = tmp_path / "remote"
+    client = make_client()
+
+    first = client.sync_local_to_remote(str(local_dir), str(remote))
+    client.disconnect()
+    second = make_client().sync_local_to_remote(str(local_dir), str(remote))
+
+    assert first["synchronized"] == 3 and first["skipped"] == 0
+    assert second["synchronized"] == 0 and second["skipped"] == 3
+    assert (remote / "sub" / "c.txt").read_bytes() == (local_dir / "sub" / "c.txt").read_bytes()
+    assert os.listdir(cache_dir) == [simplified_client.sync_cache_file(client.server_url).name]
+    assert not any(name.startswith(".mcp") for name in os.listdir(tmp_path))
+
+
+@pytest.mark.parametrize("change", ["delete", "edit"])
+def test_sync_reuploads_file_changed_on_server(make_client, local_dir, tmp_path, change):
+    """远程文件被删除或在服务器上被修改后，即使本地未变化也重新上传"""
+    remote = tmp_path / "remote"
+    client = make_client()
+    client.sync_local_to_remote(str(local_dir), str(remote))
+    if change == "delete":
+        (remote / "a.txt").unlink()
+    else:
+        (remote / "a.txt").write_bytes(b"edited on server")
+
+    result = client.sync_local_to_remote(str(local_dir), str(remote))
+
+    assert result["synchronized"] == 1 and result["skipped"] == 2
+    assert (remote / "a.txt").read_bytes() == (local_dir / "a.txt").read_bytes()
+
+
+def test_single_file_sync_confirms_with_server(make_client, local_dir, tmp_path):
+    """单个文件同样在服务器确认后才跳过"""
+    remote = tmp_path / "remote.txt"
+    client = make_client()
+    local_file = str(local_dir / "a.txt")
+
+    assert client.sync_local_to_remote(local_file, str(remote))["synchronized"] == 1
+    assert client.sync_local_to_remote(local_file, str(remote))["skipped"] == 1
+    remote.unlink()
+    assert client.sync_local_to_remote(local_file, str(remote))["synchronized"] == 1
+    assert remote.read_bytes() == (local_dir / "a.txt").read_bytes()
+
+
+def test_sync_cache_is_per_server(make_client, local_dir, tmp_path):
+    """同一本地目录同步到另一台服务器时不使用前一台服务器的缓存"""
+    remote = tmp_path / "remote"
+    first = make_client("http://server-a")
+    first.sync_local_to_remote(str(local_dir), str(remote))
+    first.disconnect()
+
+    second = make_client("http://server-b")
+    result = second.sync_local_to_remote(str(local_dir), str(remote))
+
+    assert second.sync_cache_path != first.sync_cache_path
+    assert result["synchronized"] == 3 and result["skipped"] == 0
+
+
+def test_sync_without_metadata_query_uploads_everything(make_client, local_dir, tmp_path):
+    """服务器不能确认远程文件时不跳过任何文件"""
+    remote = tmp_path / "remote"
+    client = make_client()
+    client.sync_local_to_remote(str(local_dir), str(remote))
+    client.metadata_query_supported = False
+
+    result = client.sync_local_to_remote(str(local_dir), str(remote))
+
+    assert result["synchronized"] == 3 and result["skipped"] == 0
+
+
+def test_metadata_query_reports_missing_files(tmp_path):
+    """批量元数据查询按请求顺序返回，不存在的文件exists为False"""
+    path = tmp_path / "present.bin"
+    path.write_bytes(b"content")
+
+    response = TestClient(remote_server.app).post("/api/v1/files/metadata", json={
+        "paths": [str(path), str(tmp_path / "missing.bin"), str(tmp_path)]
+    })
+
+    assert response.status_code == 200, response.text
+    files = response.json()["files"]
+    assert [item["exists"] for item in files] == [True, False, False]
+    assert files[0]["size"] == 7
+    assert files[0]["full_hash"] == remote_server._metadata_hasher()(b"content").hexdigest()
+
+
+# 批量同步：按文件数和大小拆分请求，双方都支持时使用msgpack
+
+def sync_requests(client) -> list:
+    """客户端发出的批量同步请求中的文件项列表"""
+    batches = []
+    for method, url, body in client.session.requests:
+        if url == client.sync_url:
+            batches.append(json.loads(body)["files"])
+        elif url == client.sync_msgpack_url:
+            batches.append(simplified_client.msgpack.unpackb(body, raw=False)["files"])
+    return batches
+
+
+@pytest.mark.parametrize("msgpack_sync", [False, True])
+def test_sync_files_splits_by_file_count(make_client, tmp_path, msgpack_sync):
+    """每个请求最多SYNC_REQUEST_MAX_FILES个文件，结果按请求中的文件顺序汇总"""
+    if msgpack_sync and not simplified_client.MSGPACK_AVAILABLE:
+        pytest.skip("未安装msgpack")
+    client = make_client()
+    client.msgpack_sync_supported = msgpack_sync
+    changes = [{"path": str(tmp_path / "remote" / f"{i}.txt"), "content": f"file {i}".encode()} for i in range(70)]
+
+    result = client.sync_files(changes)
+
+    assert result["status"] == "success" and result["synchronized"] == 70
+    assert [detail["path"] for detail in result["details"]] == [change["path"] for change in changes]
+    assert [len(files) for files in sync_requests(client)] == [32, 32, 6]
+    assert (tmp_path / "remote" / "69.txt").read_bytes() == b"file 69"
+
+
+def test_sync_files_splits_by_size(make_client, tmp_path, monkeypatch):
+    """单个请求的内容不超过SYNC_REQUEST_MAX_BYTES，超过上限的单个文件独占一个请求"""
+    monkeypatch.setattr(simplified_client, "SYNC_REQUEST_MAX_BYTES", 10000)
+    client = make_client()
+    sizes = [3000, 3000, 3000, 3000, 20000, 100]
+    changes = [{"path": str(tmp_path / "remote" / f"{i}.bin"), "content": os.urandom(size)}
+               for i, size in enumerate(sizes)]
+
+    result = client.sync_files(changes)
+
+    assert result["synchronized"] == len(sizes)
+    batches = sync_requests(client)
+    assert sum(len(files) for files in batches) == len(sizes)
+    for files in batches:
+        assert len(files) == 1 or sum(len(item["content"]) for item in files) <= 10000
+    assert all((tmp_path / "remote" / f"{i}.bin").read_bytes() == change["content"]
+               for i, change in enumerate(changes))
+
+
+@pytest.mark.parametrize("server_msgpack, client_msgpack", [(True, True), (False, True), (True, False)])
+def test_sync_uses_msgpack_only_when_both_sides_support_it(make_client, tmp_path, monkeypatch,
+                                                         server_msgpack, client_msgpack):
+    """任一方没有msgpack时退回Base64编码的JSON请求"""
+    if not simplified_client.MSGPACK_AVAILABLE:
+        pytest.skip("未安装msgpack")
+    monkeypatch.setattr(remote_server, "MSGPACK_AVAILABLE", server_msgpack)
+    monkeypatch.setattr(simplified_client, "MSGPACK_AVAILABLE", client_msgpack)
+    client = make_client()
+    data = os.urandom(1000)
+
+    result = client.sync_files([{"path": str(tmp_path / "remote.bin"), "content": data}])
+
+    assert result["synchronized"] == 1
+    assert (tmp_path / "remote.bin").read_bytes() == data
+    urls = [url for _, url, _ in client.session.requests if url in (client.sync_url, client.sync_msgpack_url)]
+    assert urls == [client.sync_msgpack_url if server_msgpack and client_msgpack else client.sync_url]
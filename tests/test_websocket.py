@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+WebSocket连接测试
+
+使用FastAPI的TestClient验证/ws端点的消息处理和连接清理，不需要启动服务器。
+"""
+
+import os
+import sys
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+# 导入项目模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import remote_server
+
+
+@pytest.fixture
+def client():
+    """不触发启动和关闭事件的测试客户端，避免读写元数据缓存文件"""
+    return TestClient(remote_server.app)
+
+
+def test_ping_returns_pong(client):
+    """心跳消息得到pong响应，断开后连接被移除"""
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_text('{"type":"ping"}')
+        assert orjson.loads(websocket.receive_bytes()) == {"type": "pong"}
+        assert len(remote_server.manager.queues) == 1
+
+    assert remote_server.manager.queues == {}
+    assert remote_server.manager.relay_tasks == {}
+
+
+def test_undecodable_messages_are_ignored(client):
+    """无法解析的文本、二进制帧和非对象消息不会断开连接"""
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_text("not json")
+        websocket.send_bytes(b"\xff\xfe")
+        websocket.send_text("[1, 2]")
+        websocket.send_bytes(b'{"type":"ping"}')
+        assert orjson.loads(websocket.receive_bytes()) == {"type": "pong"}
+
+    assert remote_server.manager.queues == {}
+    assert remote_server.manager.relay_tasks == {}